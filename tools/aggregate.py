@@ -0,0 +1,162 @@
+"""Per-step statistics across runs for the line plots.
+
+Instead of letting seaborn bootstrap a confidence interval at every x value of
+every panel, the mean, standard deviation and error band of ``value`` are
+computed for all tags at once, per group of ``keys`` and step, across the runs
+(ids) of that group. The plots then only draw the precomputed lines and bands.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy import stats
+except ImportError:
+    stats = None
+
+
+CI_METHODS = ("bootstrap", "t", "normal", "sd", None)
+
+# Upper bound for the resampled values held in memory at once while
+# bootstrapping
+_BOOTSTRAP_CHUNK_SIZE = 2**22
+
+
+def _bootstrap_bounds(values, codes, group_count, level, n_boot, seed):
+    """Percentile bootstrap interval of the mean of every group, vectorized."""
+    valid = ~np.isnan(values)
+    values, codes = values[valid], codes[valid]
+    order = np.argsort(codes, kind="stable")
+    values = values[order]
+    counts = np.bincount(codes, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    rng = np.random.default_rng(seed)
+    percentiles = [50 * (1 - level), 50 * (1 + level)]
+    bounds = np.full((2, group_count), np.nan)
+    groups = np.flatnonzero(counts > 0)
+    # Largest groups first, so groups of similar size share a chunk and the
+    # first group of each chunk bounds its padded size
+    groups = groups[np.argsort(-counts[groups], kind="stable")]
+    position = 0
+    while position < len(groups):
+        max_count = counts[groups[position]]
+        chunk_length = max(1, _BOOTSTRAP_CHUNK_SIZE // (n_boot * max_count))
+        chunk = groups[position : position + chunk_length]
+        position += len(chunk)
+
+        chunk_counts = counts[chunk][:, None, None]
+        draws = (rng.random((len(chunk), n_boot, max_count)) * chunk_counts).astype(
+            np.int64
+        )
+        in_sample = np.arange(max_count) < chunk_counts
+        samples = values[starts[chunk][:, None, None] + np.where(in_sample, draws, 0)]
+        means = np.where(in_sample, samples, 0).sum(axis=2) / chunk_counts[:, :, 0]
+        bounds[:, chunk] = np.percentile(means, percentiles, axis=1)
+    return bounds
+
+
+def step_bands(data, keys, ci="bootstrap", level=0.95, n_boot=1000, seed=0):
+    """Return the mean and error band of ``value`` per ``keys`` and step.
+
+    The result has the columns ``keys``, ``step``, ``value`` (mean), ``std``,
+    ``count``, ``lower`` and ``upper``, with groups in order of appearance.
+    ``ci`` selects the band:
+
+    - ``"bootstrap"``: percentile bootstrap interval of the mean with
+      ``n_boot`` resamples, like seaborn's default
+    - ``"t"``: Student t interval of the mean, requires scipy
+    - ``"normal"``: normal approximation interval of the mean
+    - ``"sd"``: one standard deviation around the mean
+    - ``None``: no band, ``lower`` and ``upper`` equal the mean
+
+    ``level`` is the confidence level of the intervals. Steps with a single
+    run have no band.
+    """
+    if ci not in CI_METHODS:
+        raise ValueError(f"Unknown CI method: {ci}, expected one of {CI_METHODS}")
+    if ci == "t" and stats is None:
+        raise ImportError("scipy is required for t confidence intervals")
+
+    grouped = data.groupby([*keys, "step"], observed=True, sort=False)["value"]
+    bands = grouped.agg(["mean", "std", "count"]).rename(columns={"mean": "value"})
+    mean = bands["value"].to_numpy()
+    std = bands["std"].to_numpy()
+    count = bands["count"].to_numpy()
+
+    if ci == "bootstrap":
+        lower, upper = _bootstrap_bounds(
+            data["value"].to_numpy(dtype=np.float64),
+            grouped.ngroup().to_numpy(),
+            len(bands),
+            level,
+            n_boot,
+            seed,
+        )
+        single = count < 2
+        lower[single] = upper[single] = np.nan
+    else:
+        # Steps with less than two runs have a NaN std and thus no band
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if ci == "t":
+                half_width = stats.t.ppf((1 + level) / 2, count - 1) * std
+                half_width /= np.sqrt(count)
+            elif ci == "normal":
+                z = NormalDist().inv_cdf((1 + level) / 2)
+                half_width = z * std / np.sqrt(count)
+            elif ci == "sd":
+                half_width = std
+            else:
+                half_width = np.zeros_like(mean)
+        lower = mean - half_width
+        upper = mean + half_width
+
+    bands["lower"] = lower
+    bands["upper"] = upper
+    return bands.reset_index()
+
+
+def _key_codes(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy()
+    return pd.factorize(series)[0]
+
+
+def split_lines(frame, keys, columns):
+    """Return ``{key values: {column: array}}`` for every group of ``keys``.
+
+    The rows are ordered once by ``keys`` and step, then every group is a
+    contiguous range of the reordered ``columns``. The returned arrays are
+    views into them, so selecting a line does not copy or rescan the frame.
+    """
+    group_codes = np.zeros(len(frame), dtype=np.int64)
+    for key in keys:
+        # Shifted by one so that the -1 code of missing values stays apart
+        codes = _key_codes(frame[key]).astype(np.int64) + 1
+        group_codes = group_codes * (int(codes.max(initial=0)) + 1) + codes
+    if group_codes.max(initial=0) < 2**15:
+        # Stable argsort of 16 bit integers is a linear radix sort
+        group_codes = group_codes.astype(np.int16)
+    order = np.argsort(group_codes, kind="stable")
+    sorted_codes = group_codes[order]
+    steps = frame["step"].to_numpy()[order]
+    starts = np.flatnonzero(np.diff(sorted_codes, prepend=sorted_codes[:1] - 1))
+    # Lines are usually logged in step order already, only sort by step if not
+    if (np.diff(steps)[np.diff(sorted_codes) == 0] < 0).any():
+        order = np.lexsort((frame["step"].to_numpy(), group_codes))
+        steps = frame["step"].to_numpy()[order]
+    ends = np.append(starts[1:], len(order))
+
+    key_values = [frame[key].iloc[order[starts]].tolist() for key in keys]
+    arrays = {
+        column: steps if column == "step" else frame[column].to_numpy()[order]
+        for column in columns
+    }
+    return {
+        tuple(values[index] for values in key_values): {
+            column: array[start:end] for column, array in arrays.items()
+        }
+        for index, (start, end) in enumerate(zip(starts, ends))
+    }
@@ -0,0 +1,315 @@
+"""Content-addressed store for the checkpoint artifacts of results trees.
+
+Checkpoints are stored many times over: ``checkpoint.pt`` is a copy of the last
+``<behavior>-<step>.pt``, the ``<behavior>.onnx`` of a run is its last ``.onnx``
+export and test runs carry copies of the training checkpoints. ``dedup`` stores
+every unique ``.onnx`` and ``.pt`` file once, as
+``<store>/objects/<sha256[:2]>/<sha256[2:]>``, and replaces the files of the
+results trees (or of packaged model repositories) with reflinks, hard links or
+symbolic links to it. Objects are made read-only, so writing through a hard or
+symbolic link fails instead of changing every file that shares the object.
+
+Every linked file is recorded in ``<store>/index.sqlite3`` with its hash, size
+and mtime, files that did not change since are not hashed again. ``verify``
+hashes the objects and reports drift: objects whose content no longer matches
+their hash, and linked files that were removed, modified or replaced by a copy::
+
+    python -m tools.artifacts dedup artifact_store results/WindFarmControl
+    python -m tools.artifacts verify artifact_store
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import hashlib
+import os
+import sqlite3
+import stat
+import sys
+
+from tools.packaging import UNCHANGED, format_stats, link_or_copy, reflink
+
+INDEX_NAME = "index.sqlite3"
+OBJECTS_DIR_NAME = "objects"
+ARTIFACT_SUFFIXES = (".onnx", ".pt")
+CHUNK_SIZE = 2**20
+
+LINK_MODES = ("auto", "reflink", "hardlink", "symlink")
+# Methods tried in order for every mode, there is no copy fallback as a copy
+# would not save any space
+_LINK_METHODS = {
+    "auto": ("reflink", "hardlink", "symlink"),
+    "reflink": ("reflink",),
+    "hardlink": ("hardlink",),
+    "symlink": ("symlink",),
+}
+
+CORRUPT = "corrupt"
+MISSING = "missing"
+MODIFIED = "modified"
+UNLINKED = "unlinked"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    path TEXT PRIMARY KEY,
+    digest TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    method TEXT
+);
+"""
+
+
+def connect(store_dir):
+    Path(store_dir).mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(Path(store_dir) / INDEX_NAME)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def object_path(store_dir, digest):
+    return Path(store_dir) / OBJECTS_DIR_NAME / digest[:2] / digest[2:]
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_artifacts(root_dir):
+    """Return the absolute paths of the checkpoint files below ``root_dir``."""
+    paths = []
+    for directory, subdirs, file_names in os.walk(os.path.abspath(root_dir)):
+        subdirs[:] = sorted(name for name in subdirs if not name.startswith("."))
+        paths.extend(
+            os.path.join(directory, name)
+            for name in sorted(file_names)
+            if name.endswith(ARTIFACT_SUFFIXES)
+        )
+    return paths
+
+
+def _add_object(path, target, mode):
+    """Store the content of ``path`` as ``target``, sharing its blocks if possible."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temporary = target.with_name(f".{target.name}.tmp")
+    if os.path.lexists(temporary):
+        os.unlink(temporary)
+    # Only reflinks keep the files independent of the object
+    link_or_copy(path, temporary, "reflink" if mode == "reflink" else "auto")
+    os.replace(temporary, target)
+    os.chmod(target, stat.S_IMODE(os.stat(target).st_mode) & ~0o222)
+
+
+def _link(target, path, mode):
+    """Replace ``path`` with a link to the object ``target``, return the method."""
+    if os.path.samefile(target, path):
+        method = "symlink" if os.path.islink(path) else "hardlink"
+        if method in _LINK_METHODS[mode]:
+            return method
+    temporary = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.dedup")
+    error = None
+    for method in _LINK_METHODS[mode]:
+        if os.path.lexists(temporary):
+            os.unlink(temporary)
+        try:
+            if method == "reflink":
+                reflink(target, temporary)
+            elif method == "hardlink":
+                os.link(target, temporary)
+            else:
+                os.symlink(os.path.abspath(target), temporary)
+        except OSError as link_error:
+            error = link_error
+            continue
+        os.replace(temporary, path)
+        return method
+    raise error
+
+
+def dedup(root_dir, store_dir, mode="auto", workers=8):
+    """Move the checkpoint files below ``root_dir`` into the store and link them.
+
+    Returns ``(stats, stored)``: ``{method: [files, bytes]}`` of the checkpoint
+    files and ``[objects, bytes]`` added to the store. Index entries of files
+    below ``root_dir`` that no longer exist are removed.
+    """
+    if mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode: {mode}, expected one of {LINK_MODES}")
+    paths = find_artifacts(root_dir)
+    connection = connect(store_dir)
+    known = {
+        path: (digest, size, mtime_ns)
+        for path, digest, size, mtime_ns in connection.execute(
+            "SELECT path, digest, size, mtime_ns FROM links"
+        )
+    }
+
+    stats = {}
+    stale = []
+    for path in paths:
+        path_stat = os.stat(path)
+        entry = known.get(path)
+        if (
+            entry is not None
+            and entry[1:] == (path_stat.st_size, path_stat.st_mtime_ns)
+            and object_path(store_dir, entry[0]).exists()
+        ):
+            counts = stats.setdefault(UNCHANGED, [0, 0])
+            counts[0] += 1
+            counts[1] += path_stat.st_size
+        else:
+            stale.append(path)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        digests = list(executor.map(file_digest, stale))
+
+    stored = [0, 0]
+    with connection:
+        for path, digest in zip(stale, digests):
+            target = object_path(store_dir, digest)
+            if not target.exists():
+                _add_object(path, target, mode)
+                stored[0] += 1
+                stored[1] += target.stat().st_size
+            method = _link(target, path, mode)
+            path_stat = os.stat(path)
+            connection.execute(
+                "INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?)",
+                (path, digest, path_stat.st_size, path_stat.st_mtime_ns, method),
+            )
+            counts = stats.setdefault(method, [0, 0])
+            counts[0] += 1
+            counts[1] += path_stat.st_size
+
+        prefix = os.path.join(os.path.abspath(root_dir), "")
+        current = set(paths)
+        connection.executemany(
+            "DELETE FROM links WHERE path = ?",
+            [
+                (path,)
+                for path in known
+                if path.startswith(prefix) and path not in current
+            ],
+        )
+    connection.close()
+    return stats, stored
+
+
+def summary(store_dir):
+    """Return ``(files, bytes, objects, object bytes)`` of the index."""
+    connection = connect(store_dir)
+    files, size = connection.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM links"
+    ).fetchone()
+    objects, object_size = connection.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) "
+        "FROM (SELECT DISTINCT digest, size FROM links)"
+    ).fetchone()
+    connection.close()
+    return files, size, objects, object_size
+
+
+def verify(store_dir, workers=8, full=False):
+    """Return ``[(problem, path)]`` of the drift of the store and its linked files.
+
+    Every object is hashed. Linked files that still share the object are
+    covered by that, reflinked files are only hashed when their size or mtime
+    changed, or always with ``full``. Problems are ``CORRUPT`` objects,
+    ``MISSING`` objects and files, ``MODIFIED`` files and ``UNLINKED`` hard or
+    symbolic links that were replaced by a copy of the object.
+    """
+    connection = connect(store_dir)
+    links = connection.execute(
+        "SELECT path, digest, size, mtime_ns, method FROM links ORDER BY path"
+    ).fetchall()
+    connection.close()
+
+    objects = sorted((Path(store_dir) / OBJECTS_DIR_NAME).glob("*/*"))
+    objects = [target for target in objects if not target.name.startswith(".")]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        object_digests = list(executor.map(file_digest, objects))
+    problems = [
+        (CORRUPT, str(target))
+        for target, digest in zip(objects, object_digests)
+        if target.parent.name + target.name != digest
+    ]
+    digests = {link[1] for link in links}
+    problems.extend(
+        (MISSING, str(object_path(store_dir, digest)))
+        for digest in sorted(digests)
+        if not object_path(store_dir, digest).exists()
+    )
+
+    pending = []
+    for path, digest, size, mtime_ns, method in links:
+        try:
+            path_stat = os.stat(path)
+        except FileNotFoundError:
+            problems.append((MISSING, path))
+            continue
+        target = object_path(store_dir, digest)
+        if target.exists() and os.path.samestat(path_stat, os.stat(target)):
+            continue
+        if (
+            full
+            or method in ("hardlink", "symlink")
+            or (path_stat.st_size, path_stat.st_mtime_ns) != (size, mtime_ns)
+        ):
+            pending.append((path, digest, method))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        path_digests = list(executor.map(file_digest, [link[0] for link in pending]))
+    for (path, digest, method), path_digest in zip(pending, path_digests):
+        if path_digest != digest:
+            problems.append((MODIFIED, path))
+        elif method in ("hardlink", "symlink"):
+            problems.append((UNLINKED, path))
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    dedup_parser = commands.add_parser(
+        "dedup", help="store the checkpoints of results trees and link them"
+    )
+    dedup_parser.add_argument("store_dir")
+    dedup_parser.add_argument("root_dirs", nargs="+", help="directories to dedup")
+    dedup_parser.add_argument("--mode", choices=LINK_MODES, default="auto")
+    dedup_parser.add_argument("--workers", type=int, default=8)
+    verify_parser = commands.add_parser(
+        "verify", help="check the store and the linked files for drift"
+    )
+    verify_parser.add_argument("store_dir")
+    verify_parser.add_argument("--workers", type=int, default=8)
+    verify_parser.add_argument(
+        "--full", action="store_true", help="hash every linked file"
+    )
+    args = parser.parse_args()
+
+    if args.command == "dedup":
+        for root_dir in args.root_dirs:
+            stats, (objects, size) = dedup(
+                root_dir, args.store_dir, args.mode, args.workers
+            )
+            print(
+                f"{root_dir}: {format_stats(stats) or 'no checkpoints'}, "
+                f"{objects} new objects ({size / 2**20:.1f} MiB)"
+            )
+        files, size, objects, object_size = summary(args.store_dir)
+        print(
+            f"Store: {files} files ({size / 2**20:.1f} MiB) in {objects} objects "
+            f"({object_size / 2**20:.1f} MiB)"
+        )
+    else:
+        problems = verify(args.store_dir, args.workers, args.full)
+        for problem, path in problems:
+            print(f"{problem}: {path}")
+        files, _, objects, _ = summary(args.store_dir)
+        print(f"Verified {files} files in {objects} objects, {len(problems)} problems")
+        if problems:
+            sys.exit(1)
@@ -0,0 +1,79 @@
+"""Compare write time and size of the group PDFs for the plot output modes.
+
+python tools/benchmarks/bench_plot_output.py [steps] [raster_dpi]
+
+Renders a synthetic environment (4 groups, 12 tags, training and test, 3 runs
+each) as one vector PDF per group with every point, the output before
+decimation, then with the default decimation, and as one rasterized
+multi-page PDF.
+"""
+
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from viz_baseline_results import plot_data_for_groups
+
+
+def make_frame(steps, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for task in range(4):
+        for source in ("training", "test"):
+            for run_id in range(3):
+                for tag in range(12):
+                    walk = np.cumsum(rng.normal(size=steps))
+                    frames.append(
+                        pd.DataFrame(
+                            {
+                                "step": np.arange(steps, dtype=np.int64) * 1000,
+                                "tag": f"Synthetic/Tag {tag}",
+                                "value": walk,
+                                "difficulty_or_pattern_key": "pattern",
+                                "difficulty_or_pattern_value": 0,
+                                "task": task,
+                                "id": run_id,
+                                "env_name": "Synthetic",
+                                "source": source,
+                            }
+                        )
+                    )
+    return pd.concat(frames, ignore_index=True)
+
+
+def measure(frame, **kwargs):
+    with tempfile.TemporaryDirectory() as output_path:
+        start = time.perf_counter()
+        plot_data_for_groups(frame, output_path, ci="sd", cache=False, **kwargs)
+        seconds = time.perf_counter() - start
+        files = list(Path(output_path).glob("*.pdf"))
+        return seconds, len(files), sum(file.stat().st_size for file in files)
+
+
+if __name__ == "__main__":
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    raster_dpi = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    frame = make_frame(steps)
+    print(f"Rows: {len(frame)}, steps per run: {steps}")
+
+    modes = {
+        "vector, every point": {"max_points": None},
+        "vector, decimated": {},
+        f"rasterized at {raster_dpi} DPI, multi-page": {
+            "raster_dpi": raster_dpi,
+            "multipage": True,
+        },
+    }
+    for name, kwargs in modes.items():
+        seconds, count, size = measure(frame, **kwargs)
+        print(f"{name}: {seconds:.2f}s, {count} files, {size / 2**20:.2f} MiB")
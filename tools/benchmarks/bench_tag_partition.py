@@ -0,0 +1,80 @@
+"""Compare per-tag boolean masks against one sort and contiguous tag slices.
+
+python tools/benchmarks/bench_tag_partition.py [rows]
+
+Builds a synthetic group frame shaped like the per-step bands of
+plot_data_for_groups (default 5M rows, 16 tags, 2 sources, interleaved by step)
+and times selecting the step and value arrays of every (tag, source) line with
+one boolean mask per tag and source against split_lines.
+"""
+
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from tools.aggregate import split_lines
+
+TAGS = [f"DroneBasedReforestation/Tag {i}" for i in range(16)]
+SOURCES = ["training", "test"]
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    per_line = rows // (len(TAGS) * len(SOURCES))
+    steps = np.arange(per_line, dtype=np.int64) * 1000
+    # Interleaved by step like the event files, not sorted by tag
+    tag_codes = np.tile(np.arange(len(TAGS), dtype=np.int32), per_line * len(SOURCES))
+    source_codes = np.repeat(
+        np.arange(len(SOURCES), dtype=np.int32), per_line * len(TAGS)
+    )
+    return pd.DataFrame(
+        {
+            "step": np.tile(np.repeat(steps, len(TAGS)), len(SOURCES)),
+            "tag": pd.Categorical.from_codes(tag_codes, categories=TAGS),
+            "value": rng.normal(size=len(tag_codes)),
+            "source": np.array(SOURCES, dtype=object)[source_codes],
+        }
+    )
+
+
+def select_with_masks(group):
+    lines = {}
+    for tag in group["tag"].unique():
+        data = group[group["tag"] == tag]
+        for source in SOURCES:
+            line = data[data["source"] == source]
+            lines[tag, source] = {"step": line["step"], "value": line["value"]}
+    return lines
+
+
+def select_with_slices(group):
+    return split_lines(group, ["tag", "source"], ["step", "value"])
+
+
+def time_selection(select, group, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lines = select(group)
+        best = min(best, time.perf_counter() - start)
+    return best, lines
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    group = make_frame(rows)
+    print(f"Rows: {len(group)}, tags: {len(TAGS)}, sources: {len(SOURCES)}")
+
+    mask_seconds, mask_lines = time_selection(select_with_masks, group)
+    print(f"boolean masks: {mask_seconds:.3f}s")
+    slice_seconds, slice_lines = time_selection(select_with_slices, group)
+    print(f"sorted slices: {slice_seconds:.3f}s ({mask_seconds / slice_seconds:.1f}x)")
+
+    for key, line in mask_lines.items():
+        if not np.array_equal(line["value"], slice_lines[key]["value"]):
+            print(f"Mismatch between selections for: {key}")
@@ -0,0 +1,69 @@
+"""Compare the native event reader against tf.compat.v1.train.summary_iterator.
+
+python tools/benchmarks/bench_tfevents.py [results_root]
+"""
+
+from pathlib import Path
+import sys
+import time
+import tracemalloc
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from tools.tfevents import extract_data_from_event_file
+
+
+def extract_data_with_tensorflow(tf, file_path):
+    data = []
+    for summary in tf.compat.v1.train.summary_iterator(str(file_path)):
+        for value in summary.summary.value:
+            if value.HasField("simple_value"):
+                data.append(
+                    {
+                        "step": summary.step,
+                        "tag": value.tag,
+                        "value": value.simple_value,
+                        "wall_time": summary.wall_time,
+                    }
+                )
+    return data
+
+
+def time_reader(reader, files, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = sum(len(reader(file)) for file in files)
+        best = min(best, time.perf_counter() - start)
+    return best, records
+
+
+if __name__ == "__main__":
+    results_root = Path(sys.argv[1] if len(sys.argv) > 1 else "results")
+    files = sorted(results_root.rglob("events.out.tfevents.*"))
+    print(f"Event files: {len(files)}, {sum(f.stat().st_size for f in files)} bytes")
+
+    for check_crc in (False, True):
+        seconds, records = time_reader(
+            lambda f: extract_data_from_event_file(f, check_crc=check_crc), files
+        )
+        print(f"native (check_crc={check_crc}): {seconds:.4f}s, {records} scalars")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        import tensorflow as tf
+    except ImportError:
+        print("tensorflow is not installed, skipping the TF reference path")
+        sys.exit(0)
+    import_seconds = time.perf_counter() - start
+    import_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"tensorflow import: {import_seconds:.2f}s, {import_peak / 2**20:.0f} MiB")
+
+    seconds, records = time_reader(lambda f: extract_data_with_tensorflow(tf, f), files)
+    print(f"tensorflow: {seconds:.4f}s, {records} scalars")
+
+    for file in files:
+        if extract_data_with_tensorflow(tf, file) != extract_data_from_event_file(file):
+            print(f"Mismatch between readers for: {file}")
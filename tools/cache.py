@@ -0,0 +1,259 @@
+"""On-disk Parquet cache of parsed event data, one file per run.
+
+Every cached run is stored as ``<results root>/.event_cache/<run path>.parquet``,
+with the path of the run directory relative to the results root, with
+the columns ``step`` (int64), ``tag`` (dictionary encoded), ``value`` (float32)
+and ``wall_time`` (float64). The name, size and mtime of the run's event files
+are kept in the Parquet schema metadata, so a run is only parsed again when one
+of its event files was added, removed or modified. Together with them the byte
+offset after the last complete record of each file is stored, so files that
+only grew since they were cached are read from that offset instead of from the
+start.
+
+Report the cache state of one or more results roots with::
+
+    python -m tools.cache results/WindFarmControl/train results/WindFarmControl/test
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from tools import manifest
+from tools.tfevents import ScalarColumns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+CACHE_DIR_NAME = ".event_cache"
+FINGERPRINT_KEY = b"hivex.fingerprint"
+
+
+HIT = "hit"
+RESUMED = "resumed"
+MISS = "miss"
+
+
+class CacheStats:
+    def __init__(self):
+        self.counts = {HIT: 0, RESUMED: 0, MISS: 0}
+        self.bytes_saved = 0
+
+    def add(self, status, cached_bytes):
+        if status is not None:
+            self.counts[status] += 1
+            self.bytes_saved += cached_bytes
+
+    def __str__(self):
+        return (
+            f"Event cache: {self.counts[HIT]} hits, {self.counts[RESUMED]} resumed, "
+            f"{self.counts[MISS]} misses, "
+            f"{self.bytes_saved / 2**20:.1f} MiB of event files not parsed"
+        )
+
+
+def is_available():
+    return pq is not None
+
+
+def get_cache_dir(root_dir):
+    return Path(root_dir) / CACHE_DIR_NAME
+
+
+def event_files(agent_dir):
+    return sorted(
+        file
+        for file in Path(agent_dir).iterdir()
+        if file.name.startswith("events.out.tfevents")
+    )
+
+
+def cache_file(cache_dir, agent_dir):
+    """Return the cache file of a run, keyed by its path below the results root.
+
+    Runs with the same name in different subdirectories of a root get their
+    own file.
+    """
+    run_dir = Path(os.path.relpath(Path(agent_dir).parent, Path(cache_dir).parent))
+    return Path(cache_dir) / run_dir.parent / f"{run_dir.name}.parquet"
+
+
+def stat_event_files(agent_dir, files=None):
+    """Stat the event ``files`` of a run, listed from ``agent_dir`` if None."""
+    if files is None:
+        files = event_files(agent_dir)
+    return [(file, file.stat()) for file in files]
+
+
+def read_fingerprint(path):
+    """Return the cached ``[name, size, mtime_ns, offset]`` entries, or None.
+
+    Files written before the wall time was cached have no fingerprint, so their
+    runs are parsed again.
+    """
+    try:
+        schema = pq.read_schema(path)
+    except (OSError, pa.ArrowException):
+        return None
+    if "wall_time" not in schema.names:
+        return None
+    metadata = schema.metadata or {}
+    cached = metadata.get(FINGERPRINT_KEY)
+    return json.loads(cached) if cached is not None else None
+
+
+def is_fresh(fingerprint, files):
+    return [entry[:3] for entry in fingerprint] == [
+        [file.name, stat.st_size, stat.st_mtime_ns] for file, stat in files
+    ]
+
+
+def resume_offsets(fingerprint, files):
+    """Return ``{name: offset}`` to continue reading from, or None.
+
+    Resuming is only possible if every cached event file still exists and has
+    not shrunk, i.e. the files were only appended to since they were cached.
+    """
+    sizes = {file.name: stat.st_size for file, stat in files}
+    offsets = {}
+    for entry in fingerprint:
+        if len(entry) != 4 or sizes.get(entry[0], -1) < entry[1]:
+            return None
+        offsets[entry[0]] = entry[3]
+    return offsets
+
+
+def check_agent_dir(agent_dir, cache_dir, files=None):
+    """Stat the event files of a run and compare them with its cache file.
+
+    ``files`` are the event files of the run, e.g. of its manifest entry, and
+    listed from ``agent_dir`` if None. Returns ``(files, path, status, offsets)``
+    where ``offsets`` holds the cached offset of each file when ``status`` is
+    RESUMED.
+    """
+    files = stat_event_files(agent_dir, files)
+    path = cache_file(cache_dir, agent_dir)
+    fingerprint = read_fingerprint(path) if path.exists() else None
+    if fingerprint is None:
+        return files, path, MISS, {}
+    if is_fresh(fingerprint, files):
+        return files, path, HIT, {}
+    offsets = resume_offsets(fingerprint, files)
+    if offsets is None:
+        return files, path, MISS, {}
+    return files, path, RESUMED, offsets
+
+
+def read_cached(path):
+    table = pq.read_table(path, read_dictionary=["tag"])
+    tag = table.column("tag").combine_chunks()
+    columns = ScalarColumns()
+    for name in tag.dictionary.to_pylist():
+        columns.tag_code(name.encode("utf-8"))
+    columns.steps.frombytes(table.column("step").to_numpy().astype(np.int64).tobytes())
+    columns.codes.frombytes(tag.indices.to_numpy().astype(np.int32).tobytes())
+    columns.values.frombytes(
+        table.column("value").to_numpy().astype(np.float32).tobytes()
+    )
+    columns.wall_times.frombytes(
+        table.column("wall_time").to_numpy().astype(np.float64).tobytes()
+    )
+    return columns
+
+
+def write_cached(path, fingerprint, columns, metadata=None):
+    """Write ``columns`` to ``path`` with the fingerprint and extra schema metadata."""
+    table = pa.table(
+        {
+            "step": pa.array(np.frombuffer(columns.steps, dtype=np.int64)),
+            "tag": pa.DictionaryArray.from_arrays(
+                pa.array(np.frombuffer(columns.codes, dtype=np.int32)),
+                pa.array(columns.tags, type=pa.string()),
+            ),
+            "value": pa.array(np.frombuffer(columns.values, dtype=np.float32)),
+            "wall_time": pa.array(np.frombuffer(columns.wall_times, dtype=np.float64)),
+        }
+    )
+    table = table.replace_schema_metadata(
+        {FINGERPRINT_KEY: json.dumps(fingerprint), **(metadata or {})}
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write next to the target and rename, so concurrent readers never see a
+    # partially written file
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    pq.write_table(table, temp_path)
+    os.replace(temp_path, path)
+
+
+def load_agent_dir(agent_dir, cache_dir, read_file, files=None):
+    """Return ``(columns, status, cached_bytes, failed)`` of one ``Agent`` directory.
+
+    ``read_file(file, columns, offset)`` appends the scalars of ``file`` from
+    ``offset`` on and returns the offset after the last complete record, or
+    None if the file could not be read. It is called for new files and, from
+    the cached offset, for files that grew. ``cached_bytes`` is the number of
+    event file bytes that were not parsed, ``failed`` the event files that
+    could not be read. ``files`` are passed on to ``check_agent_dir``.
+
+    The cache file is not written if any event file could not be read, so the
+    run is parsed again on the next load instead of being cached without the
+    scalars of that file.
+    """
+    files, path, status, offsets = check_agent_dir(agent_dir, cache_dir, files)
+    if status == HIT:
+        return read_cached(path), HIT, sum(stat.st_size for _, stat in files), []
+    columns = read_cached(path) if status == RESUMED else ScalarColumns()
+
+    new_fingerprint = []
+    failed = []
+    for file, stat in files:
+        offset = read_file(file, columns, offsets.get(file.name, 0))
+        if offset is None:
+            failed.append(file)
+        else:
+            new_fingerprint.append([file.name, stat.st_size, stat.st_mtime_ns, offset])
+    if failed:
+        return columns, status, sum(offsets.values()), failed
+    try:
+        write_cached(path, new_fingerprint, columns)
+    except OSError as error:
+        print(f"Could not write event cache file: {path} ({error})")
+    return columns, status, sum(offsets.values()), failed
+
+
+def cache_status(root_dir):
+    """Count the runs below ``root_dir`` that would be served from the cache."""
+    stats = CacheStats()
+    cache_dir = get_cache_dir(root_dir)
+    for run in manifest.scan(root_dir):
+        agent_dir = run["agent_dir"]
+        files, _, status, offsets = check_agent_dir(agent_dir, cache_dir)
+        if status == HIT:
+            stats.add(HIT, sum(stat.st_size for _, stat in files))
+        else:
+            stats.add(status, sum(offsets.values()))
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("root_dirs", nargs="+", help="results roots to inspect")
+    args = parser.parse_args()
+
+    if not is_available():
+        sys.exit("pyarrow is required for the event cache")
+
+    for root_dir in args.root_dirs:
+        cache_dir = get_cache_dir(root_dir)
+        cache_bytes = sum(f.stat().st_size for f in cache_dir.rglob("*.parquet"))
+        print(f"{root_dir}: {cache_status(root_dir)}")
+        print(f"  {cache_dir}: {cache_bytes / 2**20:.1f} MiB")
@@ -0,0 +1,251 @@
+"""Index of the checkpoints of every run from ``training_status.json``.
+
+ML-Agents records the checkpoints it keeps in ``run_logs/training_status.json``
+with their steps, the mean reward at that point (null when no summary was
+written since the previous checkpoint), their creation time and the ``.pt``
+files saved next to the ``.onnx`` export. The paths are recorded relative to
+the directory training ran in, on Windows with backslashes, so they are mapped
+into the local run directory. Paths that cannot be mapped into it show up as
+missing and are never deleted.
+
+``select`` picks the best (highest reward) or last checkpoints of every run and
+behavior, ``prune`` deletes the files of all other checkpoints. The last
+checkpoint is kept as well by default, it matches the exported
+``<behavior>.onnx`` of the run. ``training_status.json`` itself is left
+unchanged, pruned checkpoints show up as missing in the index::
+
+    python -m tools.checkpoints list results/WindFarmControl/train
+    python -m tools.checkpoints prune results/WindFarmControl/train --keep 2 --dry-run
+"""
+
+from pathlib import Path, PureWindowsPath
+import argparse
+import json
+import os
+
+import pandas as pd
+
+from tools import manifest
+
+STATUS_PATH = Path("run_logs") / "training_status.json"
+POLICIES = ("best", "last")
+RUN_KEYS = ["run_dir", "behavior"]
+
+
+def status_file(run_dir):
+    return Path(run_dir) / STATUS_PATH
+
+
+def _within(path, directory):
+    """Return whether the file ``path`` lies below ``directory``.
+
+    Its parent directories are resolved but not the file itself, a symbolic
+    link into an artifact store (``tools.artifacts``) is within its run.
+    """
+    directory = os.path.realpath(directory)
+    parent = os.path.realpath(os.path.dirname(os.path.abspath(path)))
+    return (
+        os.path.basename(path) not in ("", ".", "..")
+        and os.path.commonpath([parent, directory]) == directory
+    )
+
+
+def local_path(recorded_path, run_dir, behavior):
+    """Map a path of ``training_status.json`` into the local ``run_dir``.
+
+    Both separators are accepted. Paths that do not go through a directory
+    named like the run, e.g. of a renamed run, are looked up by their file name
+    in the ``behavior`` directory. Returns None for paths that would still end
+    up outside of ``run_dir``.
+    """
+    recorded_path = PureWindowsPath(recorded_path)
+    parts = recorded_path.parts
+    run_dir = Path(run_dir)
+    if run_dir.name in parts:
+        index = len(parts) - 1 - parts[::-1].index(run_dir.name)
+        path = run_dir.joinpath(*parts[index + 1 :])
+    else:
+        path = run_dir / behavior / recorded_path.name
+    return path if _within(path, run_dir) else None
+
+
+def read_status(run_dir):
+    """Return one dict per checkpoint of every behavior in the run's status file."""
+    with open(status_file(run_dir)) as file:
+        status = json.load(file)
+    checkpoints = []
+    for behavior, behavior_status in status.items():
+        if (
+            not isinstance(behavior_status, dict)
+            or "checkpoints" not in behavior_status
+        ):
+            continue
+        final_steps = (behavior_status.get("final_checkpoint") or {}).get("steps")
+        for checkpoint in behavior_status["checkpoints"]:
+            reward = checkpoint.get("reward")
+            checkpoints.append(
+                {
+                    "behavior": behavior,
+                    "steps": checkpoint["steps"],
+                    "reward": float("nan") if reward is None else reward,
+                    "creation_time": checkpoint.get("creation_time"),
+                    "file": _str_or_none(
+                        local_path(checkpoint["file_path"], run_dir, behavior)
+                    ),
+                    "auxiliary_files": [
+                        _str_or_none(local_path(path, run_dir, behavior))
+                        for path in checkpoint.get("auxillary_file_paths", [])
+                    ],
+                    "final": checkpoint["steps"] == final_steps,
+                }
+            )
+    return checkpoints
+
+
+def _str_or_none(path):
+    return None if path is None else str(path)
+
+
+def _files(checkpoint):
+    """Return the local files of a checkpoint, without unmapped paths."""
+    files = [checkpoint["file"], *checkpoint["auxiliary_files"]]
+    return [file for file in files if file is not None]
+
+
+def load_index(root_dirs):
+    """Return one row per checkpoint of every run below ``root_dirs``.
+
+    Rows have the run metadata of the manifest, ``run_dir``, the checkpoint
+    fields of ``read_status`` and whether its files ``exist`` with their total
+    ``size`` in bytes.
+    """
+    rows = []
+    for root_dir in root_dirs:
+        for run in manifest.scan(root_dir):
+            run_dir = run["agent_dir"].parent
+            if not status_file(run_dir).exists():
+                continue
+            metadata = {field: run[field] for field in manifest.RUN_FIELDS}
+            for checkpoint in read_status(run_dir):
+                files = [file for file in _files(checkpoint) if os.path.exists(file)]
+                rows.append(
+                    {
+                        **metadata,
+                        "name": run["name"],
+                        "run_dir": str(run_dir),
+                        **checkpoint,
+                        "exists": checkpoint["file"] in files,
+                        "size": sum(os.path.getsize(file) for file in files),
+                    }
+                )
+    return pd.DataFrame(rows)
+
+
+def select(index, policy="best", top=1):
+    """Return the ``top`` best or last checkpoints of every run and behavior.
+
+    ``best`` ranks by reward, checkpoints without a reward come after all
+    rewarded ones and ties go to the later checkpoint. ``last`` ranks by
+    steps.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown policy: {policy}, expected one of {POLICIES}")
+    order = ["reward", "steps"] if policy == "best" else ["steps"]
+    ranked = index.sort_values(
+        order, ascending=False, na_position="last", kind="stable"
+    )
+    return ranked.groupby(RUN_KEYS, sort=False).head(top).sort_index()
+
+
+def retained(index, keep=1, policy="best", keep_last=True):
+    """Return the index labels of the checkpoints kept by the retention policy.
+
+    These are the ``keep`` best or last checkpoints of every run and behavior,
+    with ``keep_last`` also its last checkpoint.
+    """
+    kept = select(index, policy, keep).index
+    if keep_last:
+        kept = kept.union(select(index, "last", 1).index)
+    return kept
+
+
+def prune(index, keep=1, policy="best", keep_last=True, dry_run=False):
+    """Delete the files of the checkpoints that are not ``retained``.
+
+    Returns the rows of the pruned checkpoints, their files are only deleted
+    without ``dry_run``. Files shared with a kept checkpoint and files that do
+    not resolve to a path below the ``run_dir`` of their row are kept.
+    """
+    kept = retained(index, keep, policy, keep_last)
+    kept_files = {file for _, row in index.loc[kept].iterrows() for file in _files(row)}
+    pruned = index.drop(kept)
+    pruned = pruned[pruned["size"] > 0]
+    if not dry_run:
+        for _, row in pruned.iterrows():
+            for file in _files(row):
+                if file in kept_files or not os.path.exists(file):
+                    continue
+                if not _within(file, row["run_dir"]):
+                    print(f"Not deleting file outside of its run: {file}")
+                    continue
+                os.unlink(file)
+    return pruned
+
+
+def checkpoint_files(run_dir, keep=1, policy="best", keep_last=True):
+    """Return the paths relative to ``run_dir`` of the ``retained`` checkpoint files.
+
+    Returns None if the run has no ``training_status.json``.
+    """
+    if not status_file(run_dir).exists():
+        return None
+    index = pd.DataFrame(read_status(run_dir)).assign(run_dir=str(run_dir))
+    if index.empty:
+        return set()
+    kept = retained(index, keep, policy, keep_last)
+    return {
+        os.path.relpath(file, run_dir)
+        for _, row in index.loc[kept].iterrows()
+        for file in _files(row)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="print the checkpoint index")
+    prune_parser = commands.add_parser(
+        "prune", help="delete all but the best or last checkpoints"
+    )
+    for command_parser in (list_parser, prune_parser):
+        command_parser.add_argument("root_dirs", nargs="+", help="results roots")
+        command_parser.add_argument("--policy", choices=POLICIES, default="best")
+        command_parser.add_argument(
+            "--keep", type=int, default=1, help="checkpoints to keep per run"
+        )
+    prune_parser.add_argument(
+        "--no-keep-last",
+        dest="keep_last",
+        action="store_false",
+        help="do not keep the last checkpoint in addition",
+    )
+    prune_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    index = load_index(args.root_dirs)
+    if index.empty:
+        raise SystemExit("No training_status.json found")
+    columns = ["name", "behavior", "steps", "reward", "final", "exists", "size"]
+    with pd.option_context("display.max_rows", None, "display.width", None):
+        if args.command == "list":
+            index["selected"] = index.index.isin(
+                select(index, args.policy, args.keep).index
+            )
+            print(index[[*columns, "selected"]].to_string(index=False))
+        else:
+            pruned = prune(index, args.keep, args.policy, args.keep_last, args.dry_run)
+            print(pruned[columns].to_string(index=False))
+            print(
+                f"{'Would prune' if args.dry_run else 'Pruned'} {len(pruned)} of "
+                f"{len(index)} checkpoints, {pruned['size'].sum() / 2**20:.1f} MiB"
+            )
@@ -0,0 +1,286 @@
+"""Hive-partitioned on-disk dataset of the scalars of whole results archives.
+
+Every run is stored as one Parquet file in the partition of its environment,
+source, task and pattern/difficulty::
+
+    <dataset>/env_name=WindFarmControl/source=test/task=0/difficulty_or_pattern_value=1/<run>.<key>.parquet
+
+where ``<key>`` is a hash of the source and the run directory below its results
+root, so runs with the same name in different subdirectories get their own file
+and the same archive written from another mount gets the same files. Files have
+the columns of the event cache (``step``, dictionary encoded ``tag``, ``value``
+and ``wall_time``) and the run metadata in the Parquet schema metadata. The
+source is the label of the results roots the runs were written from, like the
+``label`` of ``load_event_data``. Runs are only written again when their event
+files changed. A write replaces the source in the environments of its roots, so
+runs that were removed from the roots are removed from the dataset; write all
+roots of one source and environment in one call.
+
+``iter_partitions`` reads the dataset one group of partitions at a time into
+the same DataFrame as ``load_event_data``, so peak memory is bounded by the
+largest group instead of the whole archive. Write and list a dataset with::
+
+    python -m tools.dataset write dataset training results/WindFarmControl/train
+    python -m tools.dataset write dataset test results/WindFarmControl/test
+    python -m tools.dataset list dataset
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import pandas as pd
+
+from tools import cache as event_cache
+from tools import manifest
+from tools.loader import RUN_COLUMNS, build_data_frame, load_agent_dir, select_tags
+
+PARTITION_KEYS = ["env_name", "source", "task", "difficulty_or_pattern_value"]
+RUN_KEY = b"hivex.run"
+
+# Sources in the order the plots concatenate them, others come after them
+SOURCE_ORDER = ["training", "test"]
+
+
+def partition_dir(dataset_dir, run):
+    return Path(dataset_dir).joinpath(*(f"{key}={run[key]}" for key in PARTITION_KEYS))
+
+
+def run_file(dataset_dir, run):
+    """Return the file of a run, keyed by its name, ``source`` and ``path``."""
+    run_dir = f"{run['source']}/{run['path']}"
+    key = hashlib.blake2b(run_dir.encode(), digest_size=4).hexdigest()
+    return partition_dir(dataset_dir, run) / f"{run['name']}.{key}.parquet"
+
+
+def run_name(path):
+    """Return the run name of a ``run_file``."""
+    return Path(path).stem.rsplit(".", 1)[0]
+
+
+def write_run(run, dataset_dir, cache_dir=None):
+    """Write one run to its partition unless it is up to date, return whether it was.
+
+    ``run`` is a run of the manifest with its ``source`` label and the
+    ``path`` of its run directory below the results root. Runs
+    with an unreadable event file are not written.
+    """
+    path = run_file(dataset_dir, run)
+    files = event_cache.stat_event_files(run["agent_dir"], run["event_files"])
+    fingerprint = event_cache.read_fingerprint(path) if path.exists() else None
+    if fingerprint is not None and event_cache.is_fresh(fingerprint, files):
+        return False
+
+    columns, *_, failed = load_agent_dir(
+        run["agent_dir"], cache_dir, files=run["event_files"]
+    )
+    if failed:
+        # Like the event cache, a run is not stored without the scalars of a
+        # file, so it is read again on the next write
+        print(f"Not writing run with unreadable event files: {run['agent_dir']}")
+        return False
+    metadata = {field: run[field] for field in [*manifest.RUN_FIELDS, "source"]}
+    event_cache.write_cached(
+        path,
+        [[file.name, stat.st_size, stat.st_mtime_ns] for file, stat in files],
+        columns,
+        {RUN_KEY: json.dumps(metadata)},
+    )
+    return True
+
+
+def write_dataset(root_dirs, dataset_dir, source, workers=1, cache=True):
+    """Add or update the runs below ``root_dirs`` in the dataset as ``source``.
+
+    ``root_dirs`` is one results root or a list of them. Returns ``(written,
+    unchanged, removed)`` run counts. Parquet files in the ``source`` partitions
+    of the environments of the roots that none of their runs maps to are
+    removed. Raises ValueError if two runs of the roots map to the same file.
+    """
+    if isinstance(root_dirs, (str, os.PathLike)):
+        root_dirs = [root_dirs]
+    runs = []
+    cache_dirs = []
+    for root_dir in root_dirs:
+        cache_dir = event_cache.get_cache_dir(root_dir) if cache else None
+        for run in manifest.scan(root_dir, persist=cache):
+            path = os.path.relpath(run["agent_dir"].parent, root_dir)
+            runs.append({**run, "source": source, "path": Path(path).as_posix()})
+            cache_dirs.append(cache_dir)
+
+    expected = {}
+    for run in runs:
+        path = run_file(dataset_dir, run)
+        if path in expected:
+            raise ValueError(
+                f"Runs {expected[path]['agent_dir']} and {run['agent_dir']} "
+                f"both map to {path}"
+            )
+        expected[path] = run
+
+    if workers > 1 and len(runs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                executor.map(write_run, runs, repeat(dataset_dir), cache_dirs)
+            )
+    else:
+        results = [
+            write_run(run, dataset_dir, cache_dir)
+            for run, cache_dir in zip(runs, cache_dirs)
+        ]
+
+    removed = 0
+    for env_name in {run["env_name"] for run in runs}:
+        source_dir = Path(dataset_dir) / f"env_name={env_name}" / f"source={source}"
+        for path in source_dir.glob("*/*/*.parquet"):
+            if path not in expected:
+                path.unlink()
+                removed += 1
+    return sum(results), len(results) - sum(results), removed
+
+
+def _matches(values, filters):
+    for key, wanted in filters.items():
+        if not isinstance(wanted, (list, tuple, set)):
+            wanted = [wanted]
+        if values[key] not in {str(value) for value in wanted}:
+            return False
+    return True
+
+
+def _source_order(source):
+    if source in SOURCE_ORDER:
+        return (SOURCE_ORDER.index(source), source)
+    return (len(SOURCE_ORDER), source)
+
+
+def partition_files(dataset_dir, run_filter=None, **filters):
+    """Return ``[(partition values, run file)]`` of the matching partitions.
+
+    Partition values are the strings of the directory names. ``filters`` map
+    partition keys to a value or a list of values to keep, ``run_filter``
+    receives the run name.
+    """
+    dataset_dir = Path(dataset_dir)
+    unknown = set(filters) - set(PARTITION_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown partition keys: {sorted(unknown)}")
+    files = []
+    for path in sorted(dataset_dir.glob("/".join("*=*" for _ in PARTITION_KEYS))):
+        values = dict(
+            part.split("=", 1) for part in path.relative_to(dataset_dir).parts
+        )
+        if not _matches(values, filters):
+            continue
+        for file in sorted(path.glob("*.parquet")):
+            if run_filter is None or run_filter(run_name(file)):
+                files.append((values, file))
+    # Runs of one source in order of their name, like the manifest of a root
+    files.sort(
+        key=lambda item: (
+            _source_order(item[0]["source"]),
+            run_name(item[1]),
+            item[1].name,
+        )
+    )
+    return files
+
+
+def read_run(path, tag_filter=None):
+    """Return ``(metadata, columns)`` of one run file."""
+    metadata = json.loads(event_cache.pq.read_schema(path).metadata[RUN_KEY])
+    columns = event_cache.read_cached(path)
+    if tag_filter is not None:
+        columns = select_tags(columns, tag_filter)
+    return metadata, columns
+
+
+def iter_partitions(
+    dataset_dir,
+    by=PARTITION_KEYS,
+    run_filter=None,
+    tag_filter=None,
+    run_columns=RUN_COLUMNS,
+    **filters,
+):
+    """Yield ``(key, DataFrame)`` for every group of partitions with the same ``by`` keys.
+
+    Each DataFrame holds the runs of one group, with the columns of
+    ``load_event_data`` and its runs in the same order: training before test
+    and by run name within a source. Groups are yielded in order of their first
+    run, so the tasks and patterns appear in the same order as in the loaded
+    DataFrame. Use ``by`` to keep rows that are aggregated together in one
+    group, e.g. both sources of a task and pattern for the plots.
+    """
+    groups = {}
+    for values, file in partition_files(dataset_dir, run_filter, **filters):
+        groups.setdefault(tuple(values[key] for key in by), []).append(file)
+    for files in groups.values():
+        runs = [read_run(file, tag_filter) for file in files]
+        key = tuple(runs[0][0][name] for name in by)
+        yield key, build_data_frame(runs, run_columns)
+
+
+def run_index(dataset_dir, run_filter=None, tag_filter=None, **filters):
+    """Return ``(runs, tags)`` of the matching runs, without reading the scalars.
+
+    ``runs`` has one row per run with its metadata, in the order of
+    ``load_event_data``, ``tags`` the tags that pass ``tag_filter`` in order
+    of first appearance. This is all the plots of the tags, tasks and patterns
+    of the data need.
+    """
+    runs = []
+    tags = {}
+    for _, file in partition_files(dataset_dir, run_filter, **filters):
+        runs.append(json.loads(event_cache.pq.read_schema(file).metadata[RUN_KEY]))
+        tag = (
+            event_cache.pq.read_table(file, columns=["tag"], read_dictionary=["tag"])
+            .column("tag")
+            .combine_chunks()
+        )
+        tags.update(
+            dict.fromkeys(
+                name
+                for name in tag.dictionary.to_pylist()
+                if tag_filter is None or tag_filter(name)
+            )
+        )
+    return pd.DataFrame(runs), list(tags)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    write_parser = commands.add_parser("write", help="add results roots to a dataset")
+    write_parser.add_argument("dataset_dir")
+    write_parser.add_argument(
+        "source", help="source label of the runs, e.g. training or test"
+    )
+    write_parser.add_argument(
+        "root_dirs", nargs="+", help="all results roots of the source to write"
+    )
+    write_parser.add_argument("--workers", type=int, default=1)
+    list_parser = commands.add_parser("list", help="list the partitions")
+    list_parser.add_argument("dataset_dir")
+    args = parser.parse_args()
+
+    if not event_cache.is_available():
+        sys.exit("pyarrow is required for the partitioned dataset")
+
+    if args.command == "write":
+        written, unchanged, removed = write_dataset(
+            args.root_dirs, args.dataset_dir, args.source, workers=args.workers
+        )
+        print(f"{written} runs written, {unchanged} unchanged, {removed} removed")
+    else:
+        partitions = {}
+        for values, file in partition_files(args.dataset_dir):
+            key = "/".join(f"{key}={values[key]}" for key in PARTITION_KEYS)
+            partitions.setdefault(key, []).append(file.stat().st_size)
+        for key, sizes in sorted(partitions.items()):
+            print(f"{key}: {len(sizes)} runs, {sum(sizes) / 2**20:.1f} MiB")
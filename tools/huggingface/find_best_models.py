@@ -1,90 +1,97 @@
-import tensorflow as tf
 from pathlib import Path
 import pandas as pd
-import re
+import argparse
 import json
-
-
-def get_difficulty_or_pattern(name):
-    match = re.search(r"(pattern|difficulty)_(\d+)", name)
-    if match:
-        return match.group(0), int(
-            match.group(2)
-        )  # Change group(1) to group(2) for the integer
-    else:
-        return ("None", "None")
-
-
-def get_task(name) -> int:
-    match = re.search(r"task_(\d+)", name)
-    if match:
-        return match.group(0), int(match.group(1))
-    else:
-        return ("None", "None")
-
-
-def get_id(name) -> int:
-    match = re.search(r"id_(\d+)", name)
-    if match:
-        return match.group(0), int(match.group(1))
-    else:
-        return ("None", "None")
-
-
-def extract_data_from_event_file(file_path):
-    data = []
-    for summary in tf.compat.v1.train.summary_iterator(str(file_path)):
-        for value in summary.summary.value:
-            if value.HasField("simple_value"):
-                data.append(
-                    {
-                        "step": summary.step,
-                        "tag": value.tag,
-                        "value": value.simple_value,
-                    }
-                )
-    return data
-
-
-def list_directories(root_dir, label):
-    all_data = []
-    root_path = Path(root_dir)
-    for path in root_path.rglob("*"):
-        if (
-            path.is_dir()
-            and str(path).endswith("Agent")
-            and "agent_count" not in path.parent.name
-        ):
-            name = path.parent.name
-            env_name = name.split("_")[0]
-            difficulty_or_pattern = get_difficulty_or_pattern(name)
-            difficulty_or_pattern_key = difficulty_or_pattern[0].split("_")[0]
-            difficulty_or_pattern_value = difficulty_or_pattern[1]
-            task = get_task(name)[1]
-            id = get_id(name)[1]
-            # print(f"Processing: {name}")
-            # print(
-            #     f"{difficulty_or_pattern_key}: {difficulty_or_pattern_value}, Task: {task}, ID: {id}"
-            # )
-
-            # Search for the specific file inside the "Agent" directory
-            for file in path.iterdir():
-                if file.name.startswith("events.out.tfevents"):
-                    # Extract data from the event file
-                    data = extract_data_from_event_file(file)
-                    # Append additional context data
-                    for entry in data:
-                        entry["difficulty_or_pattern_key"] = difficulty_or_pattern_key
-                        entry["difficulty_or_pattern_value"] = (
-                            difficulty_or_pattern_value
-                        )
-                        entry["task"] = task
-                        entry["id"] = id
-                        entry["env_name"] = env_name
-                        entry["source"] = label
-                    all_data.extend(data)
-
-    return pd.DataFrame(all_data)
+import os
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from tools.loader import load_event_data
+from tools.running_stats import RunningStats, stream_event_statistics
+from tools.tfevents import TagFilter
+
+
+def list_directories(root_dir, label, workers=1, tag_filter=None):
+    return load_event_data(
+        root_dir,
+        label,
+        run_filter=lambda name: "agent_count" not in name,
+        verbose=False,
+        workers=workers,
+        tag_filter=tag_filter,
+    )
+
+
+GROUP_COLUMNS = ["difficulty_or_pattern_value", "task", "id", "tag"]
+
+
+def dataset_statistics(data, tags):
+    """Return the mean and std per group and the tasks in order of appearance.
+
+    ``data`` is either the scalars of one environment, anything accepted by
+    ``pd.DataFrame``, or the RunningStats streamed from its event files.
+    """
+    if isinstance(data, RunningStats):
+        df_stats = data.frame()
+        df_stats = df_stats[df_stats["tag"].isin(tags)].reset_index(drop=True)
+        df_stats = df_stats.drop(columns="count").rename(
+            columns={"mean": "mean_value", "std": "std_value"}
+        )
+        # Groups are kept in the order their runs were read
+        task_order = pd.DataFrame(
+            [key[:2] for key in data.groups if key[-1] in tags],
+            columns=["difficulty_or_pattern_value", "task"],
+        ).drop_duplicates()
+        return df_stats, task_order
+
+    df = pd.DataFrame(data)
+    df_tags = df[df["tag"].isin(tags)]
+
+    # Group the data once by difficulty/pattern, task, id, and tag, then
+    # calculate the mean and std value over all steps for every group
+    df_stats = df_tags.groupby(GROUP_COLUMNS, as_index=False, observed=True).agg(
+        mean_value=("value", "mean"), std_value=("value", "std")
+    )
+    task_order = df_tags[["difficulty_or_pattern_value", "task"]].drop_duplicates()
+    return df_stats, task_order
+
+
+def find_winners(df_stats, tag_criteria):
+    """Return ``{(difficulty/pattern, task, tag): (winning id, difficulty/pattern)}``.
+
+    The best id of every group is selected at once, with a single idxmax over
+    the mean values, negated for tags whose criteria is "min". Ties go to the
+    first id, like idxmax/idxmin per group.
+    """
+    signs = {
+        tag: 1.0 if criteria == "max" else -1.0
+        for tag, criteria in tag_criteria.items()
+        if criteria in ("max", "min")
+    }
+    sign = df_stats["tag"].astype(object).map(signs).astype(float)
+    scored = df_stats.assign(score=df_stats["mean_value"] * sign)
+    scored = scored.dropna(subset=["score"])
+    idx = scored.groupby(["difficulty_or_pattern_value", "task", "tag"], observed=True)[
+        "score"
+    ].idxmax()
+    return {
+        key: (
+            int(df_stats.at[row, "id"]),
+            df_stats.at[row, "difficulty_or_pattern_value"],
+        )
+        for key, row in idx.items()
+    }
+
+
+def _lookup(mapping, d_or_p, task, tag):
+    # Without a difficulty/pattern of interest, the first one with data counts
+    if d_or_p is not None:
+        return mapping.get((d_or_p, task, tag))
+    for (_, mapped_task, mapped_tag), value in mapping.items():
+        if mapped_task == task and mapped_tag == tag:
+            return value
+    return None
 
 
 def find_best_models(
@@ -106,14 +113,6 @@ def find_best_models(
         if dataset_name == "OceanPlasticCollection":
             dataset_name = "OceanPlasticCollector"
 
-        # Convert the data into a DataFrame
-        df = pd.DataFrame(data)
-
-        # Print the tags and difficulty/patterns being used for filtering
-        # print(
-        #     f"Processing dataset: {dataset_name}, tags: {tags} and difficulty/pattern values: {d_or_p_list}"
-        # )
-
         # Initialize a dictionary for the current dataset
         grouped_dict = {}
 
@@ -122,34 +121,41 @@ def find_best_models(
             # If the list is empty, consider all data regardless of difficulty or pattern
             d_or_p_list = [None]
 
+        df_stats, task_order = dataset_statistics(data, tags)
+        present = dict.fromkeys(
+            df_stats[["difficulty_or_pattern_value", "task", "tag"]].itertuples(
+                index=False, name=None
+            ),
+            True,
+        )
+        winners = find_winners(df_stats, tag_criteria)
+
+        # Get the task-specific criteria for this dataset
+        dataset_task_criteria = task_tag_criteria.get(dataset_name, {})
+
         # Loop through each difficulty_or_pattern_of_interest in the list
         for d_or_p in d_or_p_list:
             # If d_or_p is None, skip filtering on difficulty_or_pattern_value
             if d_or_p is None:
-                df_filtered_extended = df[df["tag"].isin(tags)]
+                df_stats_d_or_p = df_stats
+                tasks = task_order["task"].unique()
             else:
-                # Filter the dataframe for the tags and difficulty_or_pattern_of_interest
-                df_filtered_extended = df[
-                    (df["tag"].isin(tags))
-                    & (
-                        df["difficulty_or_pattern_value"].isin(
-                            [d_or_p if d_or_p is not None else str(d_or_p)]
-                        )
-                    )
+                df_stats_d_or_p = df_stats[
+                    df_stats["difficulty_or_pattern_value"] == d_or_p
+                ]
+                tasks = task_order.loc[
+                    task_order["difficulty_or_pattern_value"] == d_or_p, "task"
                 ]
 
             # Verify the filtered data
-            if df_filtered_extended.empty:
+            if df_stats_d_or_p.empty:
                 print(
                     f"No data found for dataset: {dataset_name}, tags: {tags} and difficulty/pattern values: {d_or_p}"
                 )
                 continue  # Skip to the next iteration if there's no data
 
-            # Get the task-specific criteria for this dataset
-            dataset_task_criteria = task_tag_criteria.get(dataset_name, {})
-
             # Process each task according to its important tags and criteria
-            for task in df_filtered_extended["task"].unique():
+            for task in tasks:
                 # Get the important tags for this task in the current dataset (list of tags)
                 important_tags = dataset_task_criteria.get(task, [])
 
@@ -161,7 +167,7 @@ def find_best_models(
 
                 winning_id = None
 
-                # Loop over each important tag to determine the best `id`
+                # Loop over each important tag to confirm the best `id`
                 for tag in important_tags:
                     if tag not in tags:
                         print(
@@ -169,44 +175,29 @@ def find_best_models(
                         )
                         continue
 
-                    # Filter data for the current task and tag
-                    df_task_tag = df_filtered_extended[
-                        (df_filtered_extended["task"] == task)
-                        & (df_filtered_extended["tag"] == tag)
-                    ]
-
-                    if df_task_tag.empty:
+                    if not _lookup(present, d_or_p, task, tag):
                         print(
                             f"No data found for task: {task} and tag: {tag} in dataset: {dataset_name}"
                         )
                         continue
 
-                    # Group the data by task, id, difficulty/pattern, and tag, then calculate the mean and std value over all steps
-                    df_grouped = df_task_tag.groupby(
-                        ["difficulty_or_pattern_value", "task", "id", "tag"],
-                        as_index=False,
-                    ).agg(mean_value=("value", "mean"), std_value=("value", "std"))
-
-                    # Determine whether to find max or min based on the tag criteria
-                    if tag_criteria.get(tag) == "max":
-                        idx = df_grouped.groupby(
-                            ["difficulty_or_pattern_value", "task"]
-                        )["mean_value"].idxmax()
-                    elif tag_criteria.get(tag) == "min":
-                        idx = df_grouped.groupby(
-                            ["difficulty_or_pattern_value", "task"]
-                        )["mean_value"].idxmin()
-                    else:
+                    if tag_criteria.get(tag) not in ("max", "min"):
                         print(f"Tag {tag} does not have a valid criteria (max/min)")
                         continue
 
-                    # Get the winning row for this task and tag
-                    df_winning_row = df_grouped.loc[idx]
+                    # Get the winning id for this task and tag
+                    winner = _lookup(winners, d_or_p, task, tag)
+                    if winner is None:
+                        print(
+                            f"No non-NaN scores for task: {task} and tag: {tag} in dataset: {dataset_name}"
+                        )
+                        continue
+                    tag_winning_id, winning_difficulty_or_pattern_value = winner
 
                     # If this is the first tag or the same id is confirmed, set the winning id
                     if winning_id is None:
-                        winning_id = int(df_winning_row["id"].iloc[0])
-                    elif winning_id != int(df_winning_row["id"]):
+                        winning_id = tag_winning_id
+                    elif winning_id != tag_winning_id:
                         print(
                             f"Inconsistent winning ids for task: {task} in dataset: {dataset_name}"
                         )
@@ -220,20 +211,12 @@ def find_best_models(
                     continue
 
                 # Get the mean and std values for all tags for this winning id across all steps
-                df_winning_data = df_filtered_extended[
-                    (df_filtered_extended["task"] == task)
-                    & (df_filtered_extended["id"] == winning_id)
+                df_mean_values = df_stats_d_or_p[
+                    (df_stats_d_or_p["task"] == task)
+                    & (df_stats_d_or_p["id"] == winning_id)
                 ]
 
-                # Group the data by tag, difficulty, and id to compute the mean and std over all steps
-                df_mean_values = df_winning_data.groupby(
-                    ["difficulty_or_pattern_value", "task", "id", "tag"], as_index=False
-                ).agg(mean_value=("value", "mean"), std_value=("value", "std"))
-
                 # Convert the tuple key to a string representation
-                winning_difficulty_or_pattern_value = df_winning_row[
-                    "difficulty_or_pattern_value"
-                ].iloc[0]
                 key = f"{int(task)}_{winning_difficulty_or_pattern_value if winning_difficulty_or_pattern_value != None else None}"
 
                 # Store the mean and std values for all tags
@@ -248,18 +231,10 @@ def find_best_models(
         # Add the current dataset results to the final dictionary
         final_dict[f"{dataset_name}"] = grouped_dict
 
-        # Display the resulting dictionary for this dataset
-        # print(
-        #     f"Results for dataset: {dataset_name}, tags: {tags} and difficulty/pattern values: {d_or_p_list}"
-        # )
-        # print(grouped_dict)
-
     # Dump the final_dict to a JSON file (now with string keys)
     with open(output_json_path, "w") as json_file:
         json.dump(final_dict, json_file, indent=4)
 
-    # print(f"Final results have been written to {output_json_path}")
-
 
 tags_of_interest = [
     [
@@ -399,19 +374,42 @@ test_dirs = [
 
 output_json_path = "best_models_per_task_difficulty_id.json"
 
-datasets = {}
-
-for test_root_dir in test_dirs:
-    test_data = list_directories(test_root_dir, "test")
-    key = test_root_dir.split("/")[-2]
-    datasets[key] = test_data
-
-# Run the function
-find_best_models(
-    datasets,
-    tags_of_interest,
-    difficulty_or_pattern_of_interest,
-    output_json_path,
-    tag_criteria,
-    task_tag_criteria,
-)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the best model per task")
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="fold the event files into running mean/std accumulators instead "
+        "of loading every scalar, for results trees that do not fit in memory",
+    )
+    args = parser.parse_args()
+
+    datasets = {}
+
+    for test_root_dir, tags in zip(test_dirs, tags_of_interest):
+        if args.streaming:
+            test_data = stream_event_statistics(
+                test_root_dir,
+                run_filter=lambda name: "agent_count" not in name,
+                tag_filter=TagFilter(include=tags),
+                workers=os.cpu_count(),
+            )
+        else:
+            test_data = list_directories(
+                test_root_dir,
+                "test",
+                workers=os.cpu_count(),
+                tag_filter=TagFilter(include=tags),
+            )
+        key = test_root_dir.split("/")[-2]
+        datasets[key] = test_data
+
+    # Run the function
+    find_best_models(
+        datasets,
+        tags_of_interest,
+        difficulty_or_pattern_of_interest,
+        output_json_path,
+        tag_criteria,
+        task_tag_criteria,
+    )
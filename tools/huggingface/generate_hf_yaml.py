@@ -1,292 +1,278 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 import yaml
+import argparse
+import csv
 import json
 import os
-import shutil
-
-
-def generate_yaml_WFC(data, key):
-    # Extract pattern and task from the key
-    task, pattern = map(int, key.split("_"))
-    wind_farm = data[key]
-    winning_id = wind_farm["winning_id"]
-    mean_values = wind_farm["mean_values"]
-    important_tags = wind_farm["important_tags"][0]
-
-    # Prepare the basic structure
-    result = {
-        "library_name": "hivex",
-        "original_train_name": f"WindFarmControl_pattern_{pattern}_task_{task}_run_id_{winning_id}_train",
-        "tags": [
-            "hivex",
-            "hivex-wind-farm-control",
-            "reinforcement-learning",
-            "multi-agent-reinforcement-learning",
-        ],
-        "model-index": [
+import sys
+import time
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from tools.checkpoints import POLICIES, checkpoint_files
+from tools.packaging import MODES, format_stats, package_run
+
+
+def wind_farm_metric(tag):
+    if "Cumulative Reward" in tag:
+        return "cumulative_reward", "Cumulative Reward"
+    if "Individual Performance" in tag:
+        return "individual_performance", "Individual Performance"
+    return "avoid_damage_reward", "Avoid Damage Reward"
+
+
+def tag_metric(part):
+    """Metric type from one part of the tag, name from its last part."""
+
+    def metric(tag):
+        parts = tag.split("/")
+        return parts[part].lower().replace(" ", "_").replace("/", "_"), parts[-1]
+
+    return metric
+
+
+# Everything that differs between the model cards of the environments
+ENVIRONMENTS = {
+    "WindFarmControl": {
+        "abbreviation": "WFC",
+        # Key of the environment in best_models_per_task_difficulty_id.json
+        "data_key": "WindFarmControl",
+        "display_name": "Wind Farm Control",
+        "slug": "wind-farm-control",
+        "variation": "pattern",
+        "task_names": {0: "main_task"},
+        "default_task_name": "avoid_damage",
+        "metric": wind_farm_metric,
+        "skip_zero_metrics": False,
+        "episode_length": 5000,
+        "train_steps": 8000000,
+        "test_steps": 8000000,
+        "newlines": False,
+        "front_matter_end": "---",
+    },
+    "WildfireResourceManagement": {
+        "abbreviation": "WRM",
+        "data_key": "WildfireResourceManagement",
+        "display_name": "Wildfire Resource Management",
+        "slug": "wildfire-resource-management",
+        "variation": "difficulty",
+        "task_names": {0: "main_task", 1: "keep_all", 2: "distribute_all"},
+        "default_task_name": None,
+        "metric": tag_metric(1),
+        "skip_zero_metrics": False,
+        "episode_length": 500,
+        "train_steps": 450000,
+        "test_steps": 45000,
+        "newlines": False,
+        "front_matter_end": "---",
+    },
+    "DroneBasedReforestation": {
+        "abbreviation": "DBR",
+        "data_key": "DroneBasedReforestation",
+        "display_name": "Drone-Based Reforestation",
+        "slug": "drone-based-reforestation",
+        "variation": "difficulty",
+        "task_names": {
+            0: "main_task",
+            1: "find_closest_forest_perimeter",
+            2: "pick_up_seed_at_base",
+            3: "drop_seed",
+            4: "find_highest_potential_seed_drop_location",
+            5: "find_highest_potential_seed_drop_location",
+            6: "explore_furthest_distance_and_return_to_base",
+        },
+        "default_task_name": None,
+        "metric": tag_metric(-1),
+        "skip_zero_metrics": True,
+        "episode_length": 2000,
+        "train_steps": 1200000,
+        "test_steps": 300000,
+        "newlines": False,
+        "front_matter_end": "---\n\n",
+    },
+    "OceanPlasticCollection": {
+        "abbreviation": "OPC",
+        "data_key": "OceanPlasticCollector",
+        "display_name": "Ocean Plastic Collection",
+        "slug": "ocean-plastic-collection",
+        "variation": None,
+        "task_names": {
+            0: "main_task",
+            1: "find_highest_polluted_area",
+            2: "group_up",
+            3: "avoid_plastic",
+        },
+        "default_task_name": None,
+        "metric": tag_metric(1),
+        "skip_zero_metrics": False,
+        "episode_length": 5000,
+        "train_steps": 3000000,
+        "test_steps": 150000,
+        "newlines": False,
+        "front_matter_end": "---",
+    },
+    "AerialWildfireSuppression": {
+        "abbreviation": "AWS",
+        "data_key": "AerialWildfireSuppression",
+        "display_name": "Aerial Wildfire Suppression",
+        "slug": "aerial-wildfire-suppression",
+        "variation": "difficulty",
+        "task_names": {
+            0: "main_task",
+            1: "maximize_extinguished_burning_trees",
+            2: "maximize_preparing_non_burning_trees",
+            3: "minimize_time_fire_burning",
+            4: "protect_village",
+            5: "pick_up_water",
+            6: "drop_water",
+            7: "find_fire",
+            8: "find_village",
+        },
+        "default_task_name": "unknown_task",
+        "metric": tag_metric(-1),
+        "skip_zero_metrics": True,
+        "episode_length": 3000,
+        "train_steps": 1800000,
+        "test_steps": 180000,
+        "newlines": True,
+        "front_matter_end": "---\n\n",
+    },
+}
+
+
+def parse_key(key):
+    # Keys are "<task>_<pattern/difficulty>", which is "None" without one
+    task, value = key.split("_")
+    return int(task), None if value == "None" else int(value)
+
+
+def model_name(environment, key):
+    spec = ENVIRONMENTS[environment]
+    task, value = parse_key(key)
+    name = f"hivex-{spec['abbreviation']}-PPO-baseline-task-{task}"
+    if spec["variation"] is not None:
+        name += f"-{spec['variation']}-{value}"
+    return name
+
+
+def model_card(environment, data, key):
+    """Return the YAML metadata of the model card of one task and pattern/difficulty."""
+    spec = ENVIRONMENTS[environment]
+    task, value = parse_key(key)
+    model = data[key]
+    variation = spec["variation"]
+    variation_name = f"_{variation}_{value}" if variation is not None else ""
+
+    task_info = {
+        "type": ("main-task" if task == 0 else "sub-task"),
+        "name": spec["task_names"].get(task, spec["default_task_name"]),
+        "task-id": task,
+    }
+    if variation is not None:
+        task_info[f"{variation}-id"] = value
+
+    metrics = []
+    for v in model["mean_values"]:
+        if (
+            spec["skip_zero_metrics"]
+            and v["mean_value"] == 0.0
+            and v["std_value"] == 0.0
+        ):
+            continue
+        metric_type, metric_name = spec["metric"](v["tag"])
+        metrics.append(
             {
-                "name": f"hivex-WFC-PPO-baseline-task-{task}-pattern-{pattern}",
-                "results": [
-                    {
-                        "task": {
-                            "type": ("main-task" if task == 0 else "sub-task"),
-                            "name": ("main_task" if task == 0 else "avoid_damage"),
-                            "task-id": task,
-                            "pattern-id": pattern,
-                        },
-                        "dataset": {
-                            "name": "hivex-wind-farm-control",
-                            "type": "hivex-wind-farm-control",
-                        },
-                        "metrics": [
-                            (
-                                {
-                                    "type": "cumulative_reward",
-                                    "value": f"{v['mean_value']} +/- {v['std_value']}",
-                                    "name": "Cumulative Reward",
-                                    "verified": True,
-                                }
-                                if "Cumulative Reward" in v["tag"]
-                                else (
-                                    {
-                                        "type": "individual_performance",
-                                        "value": f"{v['mean_value']} +/- {v['std_value']}",
-                                        "name": "Individual Performance",
-                                        "verified": True,
-                                    }
-                                    if "Individual Performance" in v["tag"]
-                                    else {
-                                        "type": "avoid_damage_reward",
-                                        "value": f"{v['mean_value']} +/- {v['std_value']}",
-                                        "name": "Avoid Damage Reward",
-                                        "verified": True,
-                                    }
-                                )
-                            )
-                            for v in mean_values
-                        ],
-                    }
-                ],
+                "type": metric_type,
+                "value": f"{v['mean_value']} +/- {v['std_value']}",
+                "name": metric_name,
+                "verified": True,
             }
-        ],
-    }
-
-    # Convert the result to YAML format
-    results = yaml.dump(result, sort_keys=False)
-
-    # Define the directory and file paths
-    directory = f"hf_yaml_files/hivex-WFC-PPO-baseline-task-{task}-pattern-{pattern}"
-    os.makedirs(directory, exist_ok=True)
-    file_path = os.path.join(directory, "README.md")
-
-    # Save to README.md in the corresponding directory
-    with open(file_path, "w") as file:
-        file.write("---\n")
-        file.write(results)
-        file.write("---")
-
-        # Add the descriptive section
-        file.write(
-            f"This model serves as the baseline for the **Wind Farm Control** environment, "
-            f"trained and tested on task <code>{task}</code> with pattern <code>{pattern}</code> using the Proximal Policy "
-            f"Optimization (PPO) algorithm.<br><br>"
-            "Environment: **Wind Farm Control**<br>"
-            f"Task: <code>{task}</code><br>"
-            f"Pattern: <code>{pattern}</code><br>"
-            "Algorithm: <code>PPO</code><br>"
-            "Episode Length: <code>5000</code><br>"
-            "Training <code>max_steps</code>: <code>8000000</code><br>"
-            "Testing <code>max_steps</code>: <code>8000000</code><br><br>"
-            "Train & Test [Scripts](https://github.com/hivex-research/hivex)<br>"
-            "Download the [Environment](https://github.com/hivex-research/hivex-environments)"
         )
 
-    # Copy the contents of the folder corresponding to the original_train_name
-    original_train_name = result["original_train_name"]
-    source_dir = os.path.join(
-        "results", "WindFarmControl", "train", original_train_name
-    )
-    if os.path.exists(source_dir):
-        for item in os.listdir(source_dir):
-            source_item = os.path.join(source_dir, item)
-            target_item = os.path.join(directory, item)
-            if os.path.isdir(source_item):
-                shutil.copytree(source_item, target_item)
-            else:
-                shutil.copy2(source_item, target_item)
-    else:
-        print(f"Warning: Source directory '{source_dir}' does not exist.")
-
-    return results
-
-
-def generate_yaml_OPC(data, key):
-    # Extract task and difficulty from the key
-    task, difficulty = map(int, key.split("_"))
-    wildfire = data[key]
-    winning_id = wildfire["winning_id"]
-    mean_values = wildfire["mean_values"]
-
-    # Map task ID to task name
-    task_name_map = {
-        0: "main_task",
-        1: "find_highest_polluted_area",
-        2: "group_up",
-        3: "avoid_plastic",
-    }
-
-    # Prepare the basic structure
-    result = {
+    dataset = f"hivex-{spec['slug']}"
+    return {
         "library_name": "hivex",
-        "original_train_name": f"OceanPlasticCollection_task_{task}_run_id_{winning_id}_train",
+        "original_train_name": f"{environment}{variation_name}_task_{task}_run_id_{model['winning_id']}_train",
         "tags": [
             "hivex",
-            "hivex-ocean-plastic-collection",
+            dataset,
             "reinforcement-learning",
             "multi-agent-reinforcement-learning",
         ],
         "model-index": [
             {
-                "name": f"hivex-OPC-PPO-baseline-task-{task}",
+                "name": model_name(environment, key),
                 "results": [
                     {
-                        "task": {
-                            "type": ("main-task" if task == 0 else "sub-task"),
-                            "name": task_name_map.get(task),
-                            "task-id": task,
-                        },
-                        "dataset": {
-                            "name": "hivex-ocean-plastic-collection",
-                            "type": "hivex-ocean-plastic-collection",
-                        },
-                        "metrics": [
-                            {
-                                "type": v["tag"]
-                                .split("/")[1]
-                                .lower()
-                                .replace(" ", "_")
-                                .replace("/", "_"),
-                                "value": f"{v['mean_value']} +/- {v['std_value']}",
-                                "name": v["tag"].split("/")[-1],
-                                "verified": True,
-                            }
-                            for v in mean_values
-                        ],
+                        "task": task_info,
+                        "dataset": {"name": dataset, "type": dataset},
+                        "metrics": metrics,
                     }
                 ],
             }
         ],
     }
 
-    # Convert the result to YAML format
-    results = yaml.dump(result, sort_keys=False)
-
-    # Define the directory and file paths
-    directory = f"hf_yaml_files/hivex-OPC-PPO-baseline-task-{task}"
-    os.makedirs(directory, exist_ok=True)
-    file_path = os.path.join(directory, "README.md")
 
-    # Save to README.md in the corresponding directory
-    with open(file_path, "w") as file:
-        file.write("---\n")
-        file.write(results)
-        file.write("---")
-
-        # Add the descriptive section
-        file.write(
-            f"This model serves as the baseline for the **Ocean Plastic Collection** environment, "
-            f"trained and tested on task <code>{task}</code> using the Proximal Policy "
-            f"Optimization (PPO) algorithm.<br><br>"
-            "Environment: **Ocean Plastic Collection**<br>"
-            f"Task: <code>{task}</code><br>"
-            "Algorithm: <code>PPO</code><br>"
-            "Episode Length: <code>5000</code><br>"
-            "Training <code>max_steps</code>: <code>3000000</code><br>"
-            "Testing <code>max_steps</code>: <code>150000</code><br><br>"
-            "Train & Test [Scripts](https://github.com/hivex-research/hivex)<br>"
-            "Download the [Environment](https://github.com/hivex-research/hivex-environments)"
-        )
-
-    # Copy the contents of the folder corresponding to the original_train_name
-    original_train_name = result["original_train_name"]
-    source_dir = os.path.join(
-        "results", "OceanPlasticCollection", "train", original_train_name
+def model_description(environment, key):
+    """Return the README text below the YAML metadata."""
+    spec = ENVIRONMENTS[environment]
+    task, value = parse_key(key)
+    variation = spec["variation"]
+    # AWS cards break lines after every <br>, the others keep one long line
+    newline = "\n" if spec["newlines"] else ""
+    trained_on = f"task <code>{task}</code>"
+    variation_line = ""
+    if variation is not None:
+        trained_on += f" with {variation} <code>{value}</code>"
+        variation_line = f"{variation.capitalize()}: <code>{value}</code><br>{newline}"
+    return (
+        f"This model serves as the baseline for the **{spec['display_name']}** environment, "
+        f"trained and tested on {trained_on} using the Proximal Policy "
+        f"Optimization (PPO) algorithm.<br><br>{newline}{newline}"
+        f"Environment: **{spec['display_name']}**<br>{newline}"
+        f"Task: <code>{task}</code><br>{newline}"
+        f"{variation_line}"
+        f"Algorithm: <code>PPO</code><br>{newline}"
+        f"Episode Length: <code>{spec['episode_length']}</code><br>{newline}"
+        f"Training <code>max_steps</code>: <code>{spec['train_steps']}</code><br>{newline}"
+        f"Testing <code>max_steps</code>: <code>{spec['test_steps']}</code><br><br>{newline}{newline}"
+        f"Train & Test [Scripts](https://github.com/hivex-research/hivex)<br>{newline}"
+        "Download the [Environment](https://github.com/hivex-research/hivex-environments)"
     )
-    if os.path.exists(source_dir):
-        for item in os.listdir(source_dir):
-            source_item = os.path.join(source_dir, item)
-            target_item = os.path.join(directory, item)
-            if os.path.isdir(source_item):
-                shutil.copytree(source_item, target_item)
-            else:
-                shutil.copy2(source_item, target_item)
-    else:
-        print(f"Warning: Source directory '{source_dir}' does not exist.")
-
-    return results
-
-
-def generate_yaml_WRM(data, key):
-    # Extract task and difficulty from the key
-    task, difficulty = map(int, key.split("_"))
-    wildfire = data[key]
-    winning_id = wildfire["winning_id"]
-    mean_values = wildfire["mean_values"]
-    important_tags = wildfire["important_tags"][0]
-
-    # Map task ID to task name
-    task_name_map = {0: "main_task", 1: "keep_all", 2: "distribute_all"}
 
-    # Prepare the basic structure
-    result = {
-        "library_name": "hivex",
-        "original_train_name": f"WildfireResourceManagement_difficulty_{difficulty}_task_{task}_run_id_{winning_id}_train",
-        "tags": [
-            "hivex",
-            "hivex-wildfire-resource-management",
-            "reinforcement-learning",
-            "multi-agent-reinforcement-learning",
-        ],
-        "model-index": [
-            {
-                "name": f"hivex-WRM-PPO-baseline-task-{task}-difficulty-{difficulty}",
-                "results": [
-                    {
-                        "task": {
-                            "type": ("main-task" if task == 0 else "sub-task"),
-                            "name": task_name_map.get(task),
-                            "task-id": task,
-                            "difficulty-id": difficulty,
-                        },
-                        "dataset": {
-                            "name": "hivex-wildfire-resource-management",
-                            "type": "hivex-wildfire-resource-management",
-                        },
-                        "metrics": [
-                            {
-                                "type": v["tag"]
-                                .split("/")[1]
-                                .lower()
-                                .replace(" ", "_")
-                                .replace("/", "_"),
-                                "value": f"{v['mean_value']} +/- {v['std_value']}",
-                                "name": v["tag"].split("/")[-1],
-                                "verified": True,
-                            }
-                            for v in mean_values
-                        ],
-                    }
-                ],
-            }
-        ],
-    }
 
+def generate_yaml(
+    environment,
+    data,
+    key,
+    package_mode="auto",
+    final_checkpoint_only=False,
+    keep_checkpoints=None,
+    checkpoint_policy="best",
+):
+    """Write the README.md of one model and package its training run.
+
+    With ``keep_checkpoints`` only the checkpoints retained by
+    ``tools.checkpoints`` (the best or last ones of ``training_status.json``
+    and the last one) are packaged.
+
+    Returns a dict with the ``yaml`` metadata, the ``source_dir`` of the run,
+    the package ``stats`` (None if the run does not exist) and the
+    ``timings`` in seconds of every stage.
+    """
+    spec = ENVIRONMENTS[environment]
+    timings = {}
+    start = time.perf_counter()
+
+    result = model_card(environment, data, key)
     # Convert the result to YAML format
     results = yaml.dump(result, sort_keys=False)
+    timings["yaml"] = time.perf_counter() - start
 
     # Define the directory and file paths
-    directory = (
-        f"hf_yaml_files/hivex-WRM-PPO-baseline-task-{task}-difficulty-{difficulty}"
-    )
+    directory = f"hf_yaml_files/{model_name(environment, key)}"
     os.makedirs(directory, exist_ok=True)
     file_path = os.path.join(directory, "README.md")
 
@@ -294,289 +280,178 @@ def generate_yaml_WRM(data, key):
     with open(file_path, "w") as file:
         file.write("---\n")
         file.write(results)
-        file.write("---")
-
-        # Add the descriptive section
-        file.write(
-            f"This model serves as the baseline for the **Wildfire Resource Management** environment, "
-            f"trained and tested on task <code>{task}</code> with difficulty <code>{difficulty}</code> using the Proximal Policy "
-            f"Optimization (PPO) algorithm.<br><br>"
-            "Environment: **Wildfire Resource Management**<br>"
-            f"Task: <code>{task}</code><br>"
-            f"Difficulty: <code>{difficulty}</code><br>"
-            "Algorithm: <code>PPO</code><br>"
-            "Episode Length: <code>500</code><br>"
-            "Training <code>max_steps</code>: <code>450000</code><br>"
-            "Testing <code>max_steps</code>: <code>45000</code><br><br>"
-            "Train & Test [Scripts](https://github.com/hivex-research/hivex)<br>"
-            "Download the [Environment](https://github.com/hivex-research/hivex-environments)"
-        )
+        file.write(spec["front_matter_end"])
+        file.write(model_description(environment, key))
+    timings["readme"] = time.perf_counter() - start - timings["yaml"]
 
-    # Copy the contents of the folder corresponding to the original_train_name
-    original_train_name = result["original_train_name"]
+    # Link or copy the contents of the folder corresponding to the original_train_name
     source_dir = os.path.join(
-        "results", "WildfireResourceManagement", "train", original_train_name
+        "results", environment, "train", result["original_train_name"]
     )
+    stats = None
     if os.path.exists(source_dir):
-        for item in os.listdir(source_dir):
-            source_item = os.path.join(source_dir, item)
-            target_item = os.path.join(directory, item)
-            if os.path.isdir(source_item):
-                shutil.copytree(source_item, target_item)
-            else:
-                shutil.copy2(source_item, target_item)
-    else:
-        print(f"Warning: Source directory '{source_dir}' does not exist.")
-
-    return results
-
-
-def generate_yaml_DBR(data, key):
-    # Extract task and difficulty from the key
-    task, difficulty = map(int, key.split("_"))
-    drone = data[key]
-    winning_id = drone["winning_id"]
-    mean_values = drone["mean_values"]
-    important_tags = drone["important_tags"][0]
-
-    # Map task ID to task name
-    task_name_map = {
-        0: "main_task",
-        1: "find_closest_forest_perimeter",
-        2: "pick_up_seed_at_base",
-        3: "drop_seed",
-        4: "find_highest_potential_seed_drop_location",
-        5: "find_highest_potential_seed_drop_location",  # Repeated for task 5 based on your example
-        6: "explore_furthest_distance_and_return_to_base",
-    }
-
-    # Prepare the basic structure
-    result = {
-        "library_name": "hivex",
-        "original_train_name": f"DroneBasedReforestation_difficulty_{difficulty}_task_{task}_run_id_{winning_id}_train",
-        "tags": [
-            "hivex",
-            "hivex-drone-based-reforestation",
-            "reinforcement-learning",
-            "multi-agent-reinforcement-learning",
-        ],
-        "model-index": [
-            {
-                "name": f"hivex-DBR-PPO-baseline-task-{task}-difficulty-{difficulty}",
-                "results": [
-                    {
-                        "task": {
-                            "type": ("main-task" if task == 0 else "sub-task"),
-                            "name": task_name_map.get(task),
-                            "task-id": task,
-                            "difficulty-id": difficulty,
-                        },
-                        "dataset": {
-                            "name": "hivex-drone-based-reforestation",
-                            "type": "hivex-drone-based-reforestation",
-                        },
-                        "metrics": [
-                            {
-                                "type": v["tag"]
-                                .split("/")[-1]
-                                .lower()
-                                .replace(" ", "_")
-                                .replace("/", "_"),
-                                "value": f"{v['mean_value']} +/- {v['std_value']}",
-                                "name": v["tag"].split("/")[-1],
-                                "verified": True,
-                            }
-                            for v in mean_values
-                            if v["mean_value"] != 0.0 or v["std_value"] != 0.0
-                        ],
-                    }
-                ],
-            }
-        ],
+        checkpoints = None
+        if keep_checkpoints is not None:
+            checkpoints = checkpoint_files(
+                source_dir, keep_checkpoints, checkpoint_policy
+            )
+        stats = package_run(
+            source_dir,
+            directory,
+            package_mode,
+            final_checkpoint_only,
+            checkpoints=checkpoints,
+        )
+    timings["package"] = time.perf_counter() - start - sum(timings.values())
+    timings["total"] = time.perf_counter() - start
+    return {
+        "yaml": results,
+        "source_dir": source_dir,
+        "stats": stats,
+        "timings": timings,
     }
 
-    # Convert the result to YAML format
-    results = yaml.dump(result, sort_keys=False)
-
-    # Define the directory and file paths
-    directory = (
-        f"hf_yaml_files/hivex-DBR-PPO-baseline-task-{task}-difficulty-{difficulty}"
-    )
-    os.makedirs(directory, exist_ok=True)
-    file_path = os.path.join(directory, "README.md")
-
-    # Save to README.md in the corresponding directory
-    with open(file_path, "w") as file:
-        file.write("---\n")
-        file.write(results)
-        file.write("---\n\n")
-
-        # Add the descriptive section
-        file.write(
-            f"This model serves as the baseline for the **Drone-Based Reforestation** environment, "
-            f"trained and tested on task <code>{task}</code> with difficulty <code>{difficulty}</code> using the Proximal Policy "
-            f"Optimization (PPO) algorithm.<br><br>"
-            "Environment: **Drone-Based Reforestation**<br>"
-            f"Task: <code>{task}</code><br>"
-            f"Difficulty: <code>{difficulty}</code><br>"
-            "Algorithm: <code>PPO</code><br>"
-            "Episode Length: <code>2000</code><br>"
-            "Training <code>max_steps</code>: <code>1200000</code><br>"
-            "Testing <code>max_steps</code>: <code>300000</code><br><br>"
-            "Train & Test [Scripts](https://github.com/hivex-research/hivex)<br>"
-            "Download the [Environment](https://github.com/hivex-research/hivex-environments)"
-        )
 
-    # Copy the contents of the folder corresponding to the original_train_name
-    original_train_name = result["original_train_name"]
-    source_dir = os.path.join(
-        "results", "DroneBasedReforestation", "train", original_train_name
+def _generate_job(job, *options):
+    environment, data, key = job
+    return generate_yaml(environment, data, key, *options)
+
+
+def generate_all(
+    data,
+    environments=None,
+    workers=1,
+    package_mode="auto",
+    final_checkpoint_only=False,
+    keep_checkpoints=None,
+    checkpoint_policy="best",
+):
+    """Generate the model cards of every key of ``environments`` in ``data``.
+
+    The jobs of all environments are built from the JSON of
+    ``find_best_models`` at once and run in a process pool with ``workers >
+    1``. Yields ``(environment, key, generate_yaml result)`` in job order.
+    """
+    jobs = [
+        (environment, data[ENVIRONMENTS[environment]["data_key"]], key)
+        for environment in (environments or ENVIRONMENTS)
+        if ENVIRONMENTS[environment]["data_key"] in data
+        for key in data[ENVIRONMENTS[environment]["data_key"]]
+    ]
+    options = (
+        package_mode,
+        final_checkpoint_only,
+        keep_checkpoints,
+        checkpoint_policy,
     )
-    if os.path.exists(source_dir):
-        for item in os.listdir(source_dir):
-            source_item = os.path.join(source_dir, item)
-            target_item = os.path.join(directory, item)
-            if os.path.isdir(source_item):
-                shutil.copytree(source_item, target_item)
-            else:
-                shutil.copy2(source_item, target_item)
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                _generate_job, jobs, *([option] * len(jobs) for option in options)
+            )
+            for (environment, _, key), result in zip(jobs, results):
+                yield environment, key, result
     else:
-        print(f"Warning: Source directory '{source_dir}' does not exist.")
-
-    return results
-
-
-def generate_yaml_AWS(data, key):
-    # Extract task and difficulty from the key
-    task, difficulty = map(int, key.split("_"))
-    aerial = data[key]
-    winning_id = aerial["winning_id"]
-    mean_values = aerial["mean_values"]
-    important_tags = aerial["important_tags"][0]
-
-    # Map task ID to task name for AerialWildfireSuppression
-    task_name_map = {
-        0: "main_task",
-        1: "maximize_extinguished_burning_trees",
-        2: "maximize_preparing_non_burning_trees",
-        3: "minimize_time_fire_burning",
-        4: "protect_village",
-        5: "pick_up_water",
-        6: "drop_water",
-        7: "find_fire",
-        8: "find_village",
-    }
-
-    # Prepare the basic structure
-    result = {
-        "library_name": "hivex",
-        "original_train_name": f"AerialWildfireSuppression_difficulty_{difficulty}_task_{task}_run_id_{winning_id}_train",
-        "tags": [
-            "hivex",
-            "hivex-aerial-wildfire-suppression",
-            "reinforcement-learning",
-            "multi-agent-reinforcement-learning",
-        ],
-        "model-index": [
-            {
-                "name": f"hivex-AWS-PPO-baseline-task-{task}-difficulty-{difficulty}",
-                "results": [
-                    {
-                        "task": {
-                            "type": ("main-task" if task == 0 else "sub-task"),
-                            "name": task_name_map.get(task, "unknown_task"),
-                            "task-id": task,
-                            "difficulty-id": difficulty,
-                        },
-                        "dataset": {
-                            "name": "hivex-aerial-wildfire-suppression",
-                            "type": "hivex-aerial-wildfire-suppression",
-                        },
-                        "metrics": [
-                            {
-                                "type": v["tag"]
-                                .split("/")[-1]
-                                .lower()
-                                .replace(" ", "_")
-                                .replace("/", "_"),
-                                "value": f"{v['mean_value']} +/- {v['std_value']}",
-                                "name": v["tag"].split("/")[-1],
-                                "verified": True,
-                            }
-                            for v in mean_values
-                            if v["mean_value"] != 0.0 or v["std_value"] != 0.0
-                        ],
-                    }
-                ],
-            }
-        ],
-    }
+        for job in jobs:
+            yield job[0], job[2], _generate_job(job, *options)
+
+
+def write_summary(rows, path):
+    """Write the per-model timings and package stats as CSV."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(
+            [
+                "model",
+                "environment",
+                "yaml_seconds",
+                "readme_seconds",
+                "package_seconds",
+                "total_seconds",
+                "packaged",
+            ]
+        )
+        writer.writerows(rows)
 
-    # Convert the result to YAML format
-    results = yaml.dump(result, sort_keys=False)
 
-    # Define the directory and file paths
-    directory = (
-        f"hf_yaml_files/hivex-AWS-PPO-baseline-task-{task}-difficulty-{difficulty}"
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the model cards")
+    parser.add_argument(
+        "--input",
+        default="best_models_per_task_difficulty_id.json",
+        help="first run tools/huggingface/find_best_models.py to generate this file",
     )
-    os.makedirs(directory, exist_ok=True)
-    file_path = os.path.join(directory, "README.md")
-
-    # Save to README.md in the corresponding directory
-    with open(file_path, "w") as file:
-        file.write("---\n")
-        file.write(results)
-        file.write("---\n\n")
-
-        # Add the descriptive section
-        file.write(
-            f"This model serves as the baseline for the **Aerial Wildfire Suppression** environment, "
-            f"trained and tested on task <code>{task}</code> with difficulty <code>{difficulty}</code> using the Proximal Policy "
-            f"Optimization (PPO) algorithm.<br><br>\n\n"
-            "Environment: **Aerial Wildfire Suppression**<br>\n"
-            f"Task: <code>{task}</code><br>\n"
-            f"Difficulty: <code>{difficulty}</code><br>\n"
-            "Algorithm: <code>PPO</code><br>\n"
-            "Episode Length: <code>3000</code><br>\n"
-            "Training <code>max_steps</code>: <code>1800000</code><br>\n"
-            "Testing <code>max_steps</code>: <code>180000</code><br><br>\n\n"
-            "Train & Test [Scripts](https://github.com/hivex-research/hivex)<br>\n"
-            "Download the [Environment](https://github.com/hivex-research/hivex-environments)"
+    parser.add_argument(
+        "--environments",
+        nargs="+",
+        choices=list(ENVIRONMENTS),
+        help="environments to generate, all in the input by default",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--package-mode",
+        choices=MODES,
+        default="auto",
+        help="how run files are packaged: reflinks, hardlinks or copies, auto "
+        "uses the first that works on the target filesystem",
+    )
+    parser.add_argument(
+        "--final-checkpoint-only",
+        action="store_true",
+        help="package only the last exported checkpoint of every run",
+    )
+    parser.add_argument(
+        "--keep-checkpoints",
+        type=int,
+        help="package only this many of the best or last checkpoints of "
+        "training_status.json, and the last one",
+    )
+    parser.add_argument(
+        "--checkpoint-policy",
+        choices=POLICIES,
+        default="best",
+        help="rank the checkpoints to keep by reward or by steps",
+    )
+    parser.add_argument(
+        "--summary",
+        default="hf_yaml_files/generation_summary.csv",
+        help="CSV file with the timings of every model",
+    )
+    args = parser.parse_args()
+
+    with open(args.input) as file:
+        data = json.load(file)
+
+    start = time.perf_counter()
+    rows = []
+    for environment, key, result in generate_all(
+        data,
+        args.environments,
+        args.workers,
+        args.package_mode,
+        args.final_checkpoint_only,
+        args.keep_checkpoints,
+        args.checkpoint_policy,
+    ):
+        stats, timings = result["stats"], result["timings"]
+        if stats is None:
+            print(f"Warning: Source directory '{result['source_dir']}' does not exist.")
+        else:
+            print(f"Packaged {result['source_dir']}: {format_stats(stats)}")
+        print(result["yaml"])
+        rows.append(
+            [
+                model_name(environment, key),
+                environment,
+                *(f"{timings[stage]:.4f}" for stage in ("yaml", "readme", "package")),
+                f"{timings['total']:.4f}",
+                format_stats(stats) if stats is not None else "",
+            ]
         )
 
-    # Copy the contents of the folder corresponding to the original_train_name
-    original_train_name = result["original_train_name"]
-    source_dir = os.path.join(
-        "results", "AerialWildfireSuppression", "train", original_train_name
+    write_summary(rows, args.summary)
+    print(
+        f"Generated {len(rows)} model cards in {time.perf_counter() - start:.2f}s, "
+        f"timings per model in {args.summary}"
     )
-    if os.path.exists(source_dir):
-        for item in os.listdir(source_dir):
-            source_item = os.path.join(source_dir, item)
-            target_item = os.path.join(directory, item)
-            if os.path.isdir(source_item):
-                shutil.copytree(source_item, target_item)
-            else:
-                shutil.copy2(source_item, target_item)
-    else:
-        print(f"Warning: Source directory '{source_dir}' does not exist.")
-
-    return results
-
-
-# first run tools/huggingface/find_best_models.py to generate this file
-data = json.load(open("best_models_per_task_difficulty_id.json"))
-
-# for key in data["WindFarmControl"]:
-#     print(generate_yaml_WFC(data["WindFarmControl"], key))
-
-# for key in data["WildfireResourceManagement"]:
-#     print(generate_yaml_WRM(data["WildfireResourceManagement"], key))
-
-# for key in data["DroneBasedReforestation"]:
-#     print(generate_yaml_DBR(data["DroneBasedReforestation"], key))
-
-# for key in data["OceanPlasticCollection"]:
-#     print(generate_yaml_OPC(data["OceanPlasticCollection"], key))
-
-for key in data["AerialWildfireSuppression"]:
-    print(generate_yaml_AWS(data["AerialWildfireSuppression"], key))
@@ -0,0 +1,256 @@
+"""Columnar loading of the scalar summaries of a results tree into pandas.
+
+Instead of building one dict per scalar, every event file is decoded into
+typed buffers (int64 step, float32 value, float64 wall time, int32 tag code).
+Run metadata such as the task or id is stored once per run and broadcast into
+categorical columns when the DataFrame is built.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import struct
+
+import numpy as np
+import pandas as pd
+
+from tools import cache as event_cache
+from tools import manifest
+from tools.tfevents import ScalarColumns, read_scalars_into
+
+# Errors of unreadable or corrupt event files
+READ_ERRORS = (OSError, ValueError, IndexError, struct.error)
+
+RUN_COLUMNS = [
+    "difficulty_or_pattern_key",
+    "difficulty_or_pattern_value",
+    "task",
+    "id",
+    "env_name",
+    "source",
+]
+
+
+def _sorted_categories(values):
+    # Sorted categories keep groupby/sort output in the same order as the
+    # plain object columns used before
+    categories = list(dict.fromkeys(values))
+    try:
+        return sorted(categories)
+    except TypeError:
+        return categories
+
+
+def read_event_file(file, columns, offset=0):
+    """Append the scalars of ``file`` from ``offset`` on and return the new offset.
+
+    Unreadable or corrupt files are reported and skipped so that a single bad
+    run does not abort loading the whole results tree, for them None is
+    returned.
+    """
+    row_count = len(columns)
+    try:
+        return read_scalars_into(file, columns, offset=offset)
+    except READ_ERRORS as error:
+        print(f"Skipping unreadable event file: {file} ({error})")
+        columns.truncate(row_count)
+        return None
+
+
+def read_agent_dir(path, tag_filter=None, files=None):
+    """Parse all event files of one ``Agent`` directory into a ScalarColumns chunk.
+
+    ``files`` are the event files to parse, listed from ``path`` if None.
+    Returns ``(columns, failed)`` with the event files that could not be read.
+    """
+    if files is None:
+        files = event_cache.event_files(path)
+    columns = ScalarColumns(tag_filter)
+    failed = [file for file in files if read_event_file(file, columns) is None]
+    return columns, failed
+
+
+def select_tags(columns, tag_filter):
+    """Return a chunk holding only the scalars whose tag passes ``tag_filter``."""
+    keep = np.array([tag_filter(tag) for tag in columns.tags], dtype=bool)
+    if keep.all():
+        return columns
+    codes = np.frombuffer(columns.codes, dtype=np.int32)
+    rows = keep[codes]
+    remap = np.cumsum(keep, dtype=np.int32) - 1
+    selected = ScalarColumns(tag_filter)
+    for tag, wanted in zip(columns.tags, keep):
+        if wanted:
+            selected.tag_code(tag.encode("utf-8"))
+    selected.steps.frombytes(
+        np.frombuffer(columns.steps, dtype=np.int64)[rows].tobytes()
+    )
+    selected.codes.frombytes(remap[codes[rows]].tobytes())
+    selected.values.frombytes(
+        np.frombuffer(columns.values, dtype=np.float32)[rows].tobytes()
+    )
+    selected.wall_times.frombytes(
+        np.frombuffer(columns.wall_times, dtype=np.float64)[rows].tobytes()
+    )
+    return selected
+
+
+def load_agent_dir(path, cache_dir=None, tag_filter=None, files=None):
+    """Return ``(columns, cache_status, cached_bytes, failed)`` of one run.
+
+    ``failed`` holds the event files that could not be read. ``files`` are the
+    event files of the run from its manifest entry, so ``path`` is not listed
+    again, or None to list them. Without a cache
+    ``tag_filter`` is pushed down into the event reader. The cache always holds
+    every tag, so the filter is applied to its columns.
+    """
+    if cache_dir is None:
+        columns, failed = read_agent_dir(path, tag_filter, files)
+        return columns, None, 0, failed
+    columns, *cache_result = event_cache.load_agent_dir(
+        path, cache_dir, read_event_file, files
+    )
+    if tag_filter is not None:
+        columns = select_tags(columns, tag_filter)
+    return (columns, *cache_result)
+
+
+def build_data_frame(runs, run_columns, wall_time=False):
+    """Assemble the long-format DataFrame from per-run scalar chunks.
+
+    ``runs`` is a list of ``(metadata, columns)``, each run's metadata is
+    repeated once per scalar as a categorical column. The chunk buffers are
+    concatenated directly into the final arrays. With ``wall_time`` the event
+    wall times are added as a ``wall_time`` column after ``value``.
+    """
+    counts = np.array([len(columns) for _, columns in runs], dtype=np.int64)
+    tags = _sorted_categories(tag for _, columns in runs for tag in columns.tags)
+    tag_index = {tag: code for code, tag in enumerate(tags)}
+    tag_codes = [
+        np.array([tag_index[tag] for tag in columns.tags], dtype=np.int32)[
+            np.frombuffer(columns.codes, dtype=np.int32)
+        ]
+        for _, columns in runs
+    ]
+
+    def concatenate(arrays, dtype):
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+
+    frame = {
+        "step": concatenate(
+            [np.frombuffer(columns.steps, dtype=np.int64) for _, columns in runs],
+            np.int64,
+        ),
+        "tag": pd.Categorical.from_codes(
+            concatenate(tag_codes, np.int32), categories=tags
+        ),
+        # Widened on output so aggregations match the float64 schema exactly
+        "value": concatenate(
+            [np.frombuffer(columns.values, dtype=np.float32) for _, columns in runs],
+            np.float32,
+        ).astype(np.float64),
+    }
+    if wall_time:
+        frame["wall_time"] = concatenate(
+            [
+                np.frombuffer(columns.wall_times, dtype=np.float64)
+                for _, columns in runs
+            ],
+            np.float64,
+        )
+    for column in run_columns:
+        run_values = [metadata[column] for metadata, _ in runs]
+        categories = _sorted_categories(run_values)
+        category_codes = {value: code for code, value in enumerate(categories)}
+        run_codes = np.array([category_codes[v] for v in run_values], dtype=np.int32)
+        frame[column] = pd.Categorical.from_codes(
+            np.repeat(run_codes, counts), categories=categories
+        )
+    return pd.DataFrame(frame)
+
+
+def load_event_data(
+    root_dir,
+    label,
+    run_filter=None,
+    run_columns=RUN_COLUMNS,
+    verbose=True,
+    workers=1,
+    cache=True,
+    tag_filter=None,
+    wall_time=False,
+):
+    """Load every ``*/Agent/events.out.tfevents.*`` file below ``root_dir``.
+
+    ``run_filter`` receives the run directory name and decides whether the run
+    is loaded, ``tag_filter`` (a ``TagFilter``) selects the scalars to keep. The
+    returned frame has the columns ``step``, ``tag``, ``value``, with
+    ``wall_time`` the event wall time in seconds since the epoch, followed by
+    ``run_columns``, with ``source`` set to ``label``.
+
+    The runs and their metadata come from the persistent run manifest
+    (``tools.manifest``), so only directories that changed since the last load
+    are listed again. Without ``cache`` the directories are listed in a plain
+    scan and nothing is written below ``root_dir``.
+
+    With ``workers > 1`` the run directories are parsed in a process pool, one
+    run per task. Rows are always ordered by run directory path.
+
+    With ``cache`` enabled and pyarrow installed, parsed runs are stored in
+    ``<root_dir>/.event_cache`` and only new or modified runs are parsed again.
+    Event files that only grew since they were cached, as for runs that are
+    still training, are read from the end of their last complete record.
+    """
+    cache_dir = (
+        event_cache.get_cache_dir(root_dir)
+        if cache and event_cache.is_available()
+        else None
+    )
+
+    paths = []
+    files = []
+    run_metadata = []
+    for run in manifest.scan(root_dir, persist=cache):
+        name = run["name"]
+        if run_filter is not None and not run_filter(name):
+            continue
+        metadata = {field: run[field] for field in manifest.RUN_FIELDS}
+        metadata["source"] = label
+        if verbose:
+            print(f"Processing: {name}")
+            print(
+                f"{metadata['difficulty_or_pattern_key']}: {metadata['difficulty_or_pattern_value']}, "
+                f"Task: {metadata['task']}, ID: {metadata['id']}"
+                + (
+                    f", Agent Count: {metadata['agent_count']}"
+                    if "agent_count" in run_columns
+                    else ""
+                )
+            )
+        paths.append(run["agent_dir"])
+        files.append(run["event_files"])
+        run_metadata.append(metadata)
+
+    # The event files of the manifest are passed along so Agent/ is not listed
+    # a second time
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                executor.map(
+                    load_agent_dir, paths, repeat(cache_dir), repeat(tag_filter), files
+                )
+            )
+    else:
+        results = [
+            load_agent_dir(path, cache_dir, tag_filter, run_files)
+            for path, run_files in zip(paths, files)
+        ]
+
+    runs = []
+    stats = event_cache.CacheStats()
+    for metadata, (columns, status, cached_bytes, _) in zip(run_metadata, results):
+        runs.append((metadata, columns))
+        stats.add(status, cached_bytes)
+    if verbose and cache_dir is not None:
+        print(stats)
+
+    return build_data_frame(runs, run_columns, wall_time)
@@ -0,0 +1,231 @@
+"""Persistent index of the runs below a results root.
+
+The index lives in ``<results root>/.event_cache/manifest.sqlite3``. It is
+built by an ``os.scandir`` walk that stops at run directories: inside a run only
+``Agent/`` is listed to find its event files, checkpoints, ``run_logs`` and
+plots are never walked. For every directory its mtime and listing are stored,
+so later scans only list directories whose entries changed since the last scan.
+
+Every run is recorded with its metadata parsed from the run name (environment,
+pattern/difficulty, task, id, agent count, train/test split) and the names of
+its event files. Runs whose ``Agent/`` directory did not change are read back
+from the index, only new or changed runs are parsed again. Without ``persist``,
+or when the index cannot be written, e.g. for read-only results trees, the
+directories are listed in a plain scan. Print the index of one or more results
+roots with::
+
+    python -m tools.manifest results/WindFarmControl/train
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import re
+import sqlite3
+
+MANIFEST_NAME = "manifest.sqlite3"
+CACHE_DIR_NAME = ".event_cache"
+
+RUN_FIELDS = [
+    "env_name",
+    "difficulty_or_pattern_key",
+    "difficulty_or_pattern_value",
+    "task",
+    "id",
+    "agent_count",
+    "split",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER,
+    subdirs TEXT,
+    event_files TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    agent_dir TEXT PRIMARY KEY,
+    name TEXT,
+    env_name TEXT,
+    difficulty_or_pattern_key TEXT,
+    difficulty_or_pattern_value,
+    task,
+    id,
+    agent_count,
+    split TEXT,
+    event_files TEXT
+);
+"""
+
+
+# Every field is searched anywhere in the run name, e.g.
+# WindFarmControl_pattern_0_task_0_run_id_2_train
+RUN_NAME_PATTERN = re.compile(
+    r"^(?=(?:.*?(?P<difficulty_or_pattern_key>pattern|difficulty)"
+    r"_(?P<difficulty_or_pattern_value>\d+))?)"
+    r"(?=(?:.*?task_(?P<task>\d+))?)"
+    r"(?=(?:.*?id_(?P<id>\d+))?)"
+    r"(?=(?:.*?agent_count_(?P<agent_count>\d+))?)"
+    r"(?=(?:.*?_(?P<split>train|test)$)?)"
+)
+INTEGER_FIELDS = ["difficulty_or_pattern_value", "task", "id", "agent_count"]
+
+
+def parse_run_name(name):
+    """Return the ``RUN_FIELDS`` of a run name, ``"None"`` for missing fields."""
+    fields = RUN_NAME_PATTERN.match(name).groupdict()
+    metadata = {"env_name": name.split("_")[0]}
+    for field in RUN_FIELDS[1:]:
+        value = fields[field]
+        if value is None:
+            metadata[field] = "None"
+        else:
+            metadata[field] = int(value) if field in INTEGER_FIELDS else value
+    return metadata
+
+
+def manifest_file(root_dir):
+    return Path(root_dir) / CACHE_DIR_NAME / MANIFEST_NAME
+
+
+def connect(root_dir):
+    path = manifest_file(root_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def _read_index(root_dir):
+    """Return the stored listings and runs by path, None if it cannot be opened."""
+    try:
+        connection = connect(root_dir)
+        try:
+            directories = connection.execute(
+                "SELECT path, mtime_ns, subdirs, event_files FROM directories"
+            ).fetchall()
+            runs = connection.execute("SELECT * FROM runs").fetchall()
+        finally:
+            connection.close()
+    except (OSError, sqlite3.Error) as error:
+        # Read-only results trees still work, just without a persistent index
+        print(f"Could not open run manifest: {manifest_file(root_dir)} ({error})")
+        return None
+    return (
+        {path: listing for path, *listing in directories},
+        {row[0]: row for row in runs},
+    )
+
+
+def _write_index(root_dir, directories, runs):
+    try:
+        connection = connect(root_dir)
+        try:
+            with connection:
+                connection.execute("DELETE FROM directories")
+                connection.executemany(
+                    "INSERT INTO directories VALUES (?, ?, ?, ?)", directories
+                )
+                connection.execute("DELETE FROM runs")
+                connection.executemany(
+                    "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", runs
+                )
+        finally:
+            connection.close()
+    except (OSError, sqlite3.Error) as error:
+        print(f"Could not write run manifest: {manifest_file(root_dir)} ({error})")
+
+
+def _list_directory(path, known):
+    """Return ``(mtime_ns, subdirs, event_files)``, listing only if it changed."""
+    mtime_ns = os.stat(path).st_mtime_ns
+    if known is not None and known[0] == mtime_ns:
+        return mtime_ns, json.loads(known[1]), json.loads(known[2])
+    subdirs = []
+    event_files = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.append(entry.name)
+            elif entry.name.startswith("events.out.tfevents"):
+                event_files.append(entry.name)
+    return mtime_ns, sorted(subdirs), sorted(event_files)
+
+
+def scan(root_dir, persist=True):
+    """Update the index of ``root_dir`` and return its runs sorted by path.
+
+    Every run is a dict of ``RUN_FIELDS`` plus ``name``, ``agent_dir`` (a
+    Path) and ``event_files`` (a list of Paths). Without ``persist`` the index
+    is neither read nor written and every directory is listed and every run
+    name parsed.
+    """
+    root = Path(root_dir)
+    if not root.is_dir():
+        return []
+
+    index = _read_index(root) if persist else None
+    known, known_runs = ({}, {}) if index is None else index
+    directories = []
+    agent_dirs = []
+
+    pending = ["."]
+    while pending:
+        relative = pending.pop()
+        stored = known.get(relative)
+        mtime_ns, subdirs, event_files = _list_directory(root / relative, stored)
+        directories.append(
+            (relative, mtime_ns, json.dumps(subdirs), json.dumps(event_files))
+        )
+        if Path(relative).name == "Agent":
+            unchanged = stored is not None and stored[0] == mtime_ns
+            agent_dirs.append((relative, event_files, unchanged))
+        elif "Agent" in subdirs:
+            # Run directory: run_logs and the like are not of interest
+            pending.append(f"{relative}/Agent")
+        else:
+            pending.extend(
+                f"{relative}/{name}"
+                for name in reversed(subdirs)
+                if not name.startswith(".")
+            )
+
+    index_rows = []
+    for relative, event_files, unchanged in agent_dirs:
+        # The normalized path names the run even when the root is a run itself
+        name = Path(os.path.abspath(root / relative)).parent.name
+        row = known_runs.get(relative) if unchanged else None
+        if row is None or row[1] != name:
+            metadata = parse_run_name(name)
+            row = (relative, name, *[metadata[f] for f in RUN_FIELDS]) + (
+                json.dumps(event_files),
+            )
+        index_rows.append(row)
+    if index is not None:
+        _write_index(root, directories, index_rows)
+
+    runs = []
+    for relative, name, *fields, event_files in sorted(index_rows):
+        run = dict(zip(RUN_FIELDS, fields))
+        run["name"] = name
+        run["agent_dir"] = root / relative
+        run["event_files"] = [root / relative / f for f in json.loads(event_files)]
+        runs.append(run)
+    return runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("root_dirs", nargs="+", help="results roots to index")
+    args = parser.parse_args()
+
+    for root_dir in args.root_dirs:
+        runs = scan(root_dir)
+        print(f"{root_dir}: {len(runs)} runs")
+        for run in runs:
+            print(
+                f"  {run['name']}: "
+                + ", ".join(f"{field}={run[field]}" for field in RUN_FIELDS)
+                + f", event files: {len(run['event_files'])}"
+            )
@@ -0,0 +1,167 @@
+"""Package run directories into model repositories without duplicating files.
+
+Instead of copying every checkpoint of a run into its ``hf_yaml_files/...``
+directory, files are reflinked (copy-on-write clones, on btrfs and XFS) or
+hard linked when the target is on the same filesystem, and only copied, in a
+thread pool, when neither works. Files that are already packaged with the same
+size and modification time are left alone, so packaging again is cheap.
+
+With ``final_only`` only the last exported checkpoint of every behavior, the
+``<behavior>-<step>.onnx`` and ``.pt`` files with the highest step, is
+packaged. The intermediate checkpoints and the ``checkpoint.pt`` training
+state are left out. With ``checkpoints``, e.g. the best checkpoints of
+``tools.checkpoints.checkpoint_files``, only the listed checkpoint files are
+packaged.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import errno
+import os
+import re
+import shutil
+import sys
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MODES = ("auto", "reflink", "hardlink", "copy")
+# Methods tried in order for every mode, copying always works as a last resort
+_METHODS = {
+    "auto": ("reflink", "hardlink", "copy"),
+    "reflink": ("reflink", "copy"),
+    "hardlink": ("hardlink", "copy"),
+    "copy": ("copy",),
+}
+UNCHANGED = "unchanged"
+
+# linux/fs.h FICLONE ioctl
+_FICLONE = 0x40049409
+
+CHECKPOINT_PATTERN = re.compile(r"^(?P<behavior>.+)-(?P<step>\d+)\.(?:onnx|pt)$")
+TRAINING_STATE_NAME = "checkpoint.pt"
+
+
+def reflink(source, target):
+    """Clone ``source`` to ``target`` sharing its blocks until either is written."""
+    if fcntl is None or not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported", source)
+    try:
+        with open(source, "rb") as source_file, open(target, "wb") as target_file:
+            fcntl.ioctl(target_file.fileno(), _FICLONE, source_file.fileno())
+    except OSError:
+        if os.path.exists(target):
+            os.unlink(target)
+        raise
+    shutil.copystat(source, target)
+
+
+def _is_packaged(source, target):
+    try:
+        target_stat = os.stat(target)
+    except FileNotFoundError:
+        return False
+    source_stat = os.stat(source)
+    return os.path.samestat(source_stat, target_stat) or (
+        source_stat.st_size == target_stat.st_size
+        and source_stat.st_mtime_ns == target_stat.st_mtime_ns
+    )
+
+
+def link_or_copy(source, target, mode="auto"):
+    """Package one file and return the method used, or UNCHANGED."""
+    if _is_packaged(source, target):
+        return UNCHANGED
+    if os.path.lexists(target):
+        os.unlink(target)
+    for method in _METHODS[mode]:
+        if method == "copy":
+            shutil.copy2(source, target)
+            return method
+        try:
+            if method == "reflink":
+                reflink(source, target)
+            else:
+                os.link(source, target)
+            return method
+        except OSError:
+            # Other filesystem or no reflink/hardlink support, try the next
+            continue
+
+
+def final_checkpoints(file_names):
+    """Return the names of the highest step checkpoint files per behavior."""
+    last_steps = {}
+    for name in file_names:
+        match = CHECKPOINT_PATTERN.match(name)
+        if match:
+            behavior, step = match["behavior"], int(match["step"])
+            last_steps[behavior] = max(step, last_steps.get(behavior, step))
+    return {
+        name
+        for name in file_names
+        if (match := CHECKPOINT_PATTERN.match(name))
+        and int(match["step"]) == last_steps[match["behavior"]]
+    }
+
+
+def _is_checkpoint(name):
+    return bool(CHECKPOINT_PATTERN.match(name)) or name == TRAINING_STATE_NAME
+
+
+def select_files(source_dir, final_only=False, checkpoints=None):
+    """Return the paths relative to ``source_dir`` of the files to package.
+
+    ``checkpoints`` is a collection of relative paths of the checkpoint files to
+    package, the other checkpoint files are left out.
+    """
+    selected = []
+    for directory, subdirs, file_names in os.walk(source_dir):
+        subdirs.sort()
+        if final_only:
+            keep = final_checkpoints(file_names)
+            file_names = [
+                name for name in file_names if name in keep or not _is_checkpoint(name)
+            ]
+        relative_dir = os.path.relpath(directory, source_dir)
+        for name in sorted(file_names):
+            file = os.path.normpath(os.path.join(relative_dir, name))
+            if checkpoints is None or file in checkpoints or not _is_checkpoint(name):
+                selected.append(file)
+    return selected
+
+
+def package_run(
+    source_dir, target_dir, mode="auto", final_only=False, workers=8, checkpoints=None
+):
+    """Link or copy the files of ``source_dir`` into ``target_dir``.
+
+    Returns ``{method: [files, bytes]}`` of the packaged files.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown packaging mode: {mode}, expected one of {MODES}")
+    files = select_files(source_dir, final_only, checkpoints)
+    for relative_dir in {os.path.dirname(file) for file in files}:
+        os.makedirs(os.path.join(target_dir, relative_dir), exist_ok=True)
+
+    def package(file):
+        source = os.path.join(source_dir, file)
+        return link_or_copy(source, os.path.join(target_dir, file), mode), (
+            os.path.getsize(source)
+        )
+
+    stats = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for method, size in executor.map(package, files):
+            entry = stats.setdefault(method, [0, 0])
+            entry[0] += 1
+            entry[1] += size
+    return stats
+
+
+def format_stats(stats):
+    return ", ".join(
+        f"{files} {method} ({size / 2**20:.1f} MiB)"
+        for method, (files, size) in sorted(stats.items())
+    )
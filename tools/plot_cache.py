@@ -0,0 +1,107 @@
+"""Build cache that skips rendering figures whose inputs did not change.
+
+Every figure is fingerprinted from the data it is drawn from, its plot
+parameters and the source of the plotting code. The fingerprints are kept in
+a manifest of inputs to outputs next to the figures,
+``<output dir>/.plot_manifest.json``, and a figure is only rendered again when
+its fingerprint changed or its file is missing. Fingerprints only depend on
+content, so a report refresh after a new run re-renders just the figures of the
+affected cells.
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_NAME = ".plot_manifest.json"
+
+
+def _update(digest, part):
+    if isinstance(part, (pd.DataFrame, pd.Series)):
+        # Row labels are left out, they change whenever another slice of the
+        # same frame grows
+        columns = part.columns if isinstance(part, pd.DataFrame) else [part.name]
+        digest.update(repr(list(columns)).encode())
+        digest.update(pd.util.hash_pandas_object(part, index=False).to_numpy())
+    elif isinstance(part, bytes):
+        digest.update(part)
+    elif isinstance(part, np.ndarray):
+        digest.update(repr((part.dtype.str, part.shape)).encode())
+        digest.update(np.ascontiguousarray(part).tobytes())
+    elif isinstance(part, dict):
+        for key, value in part.items():
+            _update(digest, key)
+            _update(digest, value)
+    elif isinstance(part, (list, tuple)):
+        digest.update(f"{type(part).__name__}:{len(part)}".encode())
+        for value in part:
+            _update(digest, value)
+    else:
+        digest.update(repr(part).encode())
+    digest.update(b"\0")
+
+
+def fingerprint(*parts):
+    """Return a hex digest of DataFrames, arrays, containers and plain values.
+
+    DataFrames are hashed by column names and values only, without row labels.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        _update(digest, part)
+    return digest.hexdigest()
+
+
+def source_digest(*paths):
+    """Digest of source files, so figures are rebuilt when the plot code changes."""
+    return fingerprint(*(Path(path).read_bytes() for path in paths))
+
+
+class PlotCache:
+    def __init__(self, output_dir):
+        self.path = Path(output_dir) / MANIFEST_NAME
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+        self.skipped = 0
+        self.rendered = 0
+
+    def is_fresh(self, output_file, digest):
+        entry = self.entries.get(Path(output_file).name)
+        return (
+            entry is not None
+            and entry["fingerprint"] == digest
+            and Path(output_file).exists()
+        )
+
+    def check(self, output_file, digest):
+        """Return whether ``output_file`` has to be rendered, counting skips."""
+        if self.is_fresh(output_file, digest):
+            self.skipped += 1
+            return False
+        return True
+
+    def record(self, output_file, digest, inputs):
+        """Store the fingerprint and a description of the inputs of a new figure."""
+        self.rendered += 1
+        self.entries[Path(output_file).name] = {
+            "fingerprint": digest,
+            "inputs": inputs,
+        }
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(self.entries, indent=4, sort_keys=True))
+        os.replace(temp_path, self.path)
+
+    def __str__(self):
+        return (
+            f"Plot cache: {self.rendered} rendered, {self.skipped} unchanged "
+            f"({self.path})"
+        )
@@ -0,0 +1,227 @@
+"""SQL queries over the cached per-run scalars with an embedded DuckDB.
+
+The Parquet files of the event cache (``<results root>/.event_cache``) or of a
+partitioned dataset (``tools.dataset``) are exposed as one view, ``results``,
+with the columns ``env_name``, ``task``, ``difficulty_or_pattern_value``,
+``agent_count``, ``id``, ``source``, ``tag``, ``step``, ``value`` and
+``wall_time`` (seconds since the epoch). Results roots are given with the
+source label of their runs as ``<source>=<root>``, like the ``label`` of
+``load_event_data``, datasets carry the source of every run. Run metadata that
+does not apply to a run, e.g. the agent count of a regular run, is NULL. DuckDB
+scans the files directly, multi-threaded and out-of-core, so queries do not
+load the results into pandas first. For example the mean cumulative reward
+over the last 10% of the steps of every run, per agent count::
+
+    python -m tools.query test=results/WindFarmControl/test -e "
+        SELECT agent_count, avg(value) AS reward
+        FROM (
+            SELECT *, step >= 0.9 * max(step) OVER (
+                PARTITION BY env_name, task, difficulty_or_pattern_value,
+                    agent_count, id, source
+            ) AS last_steps
+            FROM results
+            WHERE tag = 'Environment/Cumulative Reward'
+        )
+        WHERE last_steps
+        GROUP BY agent_count
+        ORDER BY agent_count"
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+from tools import cache as event_cache
+from tools import dataset as partitioned_dataset
+from tools import manifest
+from tools.loader import read_event_file
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+VIEW_NAME = "results"
+RUN_COLUMNS = [
+    "env_name",
+    "task",
+    "difficulty_or_pattern_value",
+    "agent_count",
+    "id",
+    "source",
+]
+INTEGER_COLUMNS = ["task", "difficulty_or_pattern_value", "agent_count", "id"]
+
+
+def is_available():
+    return duckdb is not None and event_cache.is_available()
+
+
+def _refresh_cache(agent_dir, cache_dir):
+    return event_cache.load_agent_dir(agent_dir, cache_dir, read_event_file)[1]
+
+
+def root_files(root_dir, source, workers=1):
+    """Return ``[(run metadata, Parquet file)]`` of a results root labelled ``source``.
+
+    Runs whose cache file is missing or outdated are parsed into the event
+    cache first. Runs that could not be cached, e.g. with an unreadable event
+    file, are left out.
+    """
+    cache_dir = event_cache.get_cache_dir(root_dir)
+    runs = manifest.scan(root_dir)
+    stale = [
+        run["agent_dir"]
+        for run in runs
+        if event_cache.check_agent_dir(run["agent_dir"], cache_dir)[2]
+        != event_cache.HIT
+    ]
+    refresh = partial(_refresh_cache, cache_dir=cache_dir)
+    if workers > 1 and len(stale) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(refresh, stale))
+    else:
+        for agent_dir in stale:
+            refresh(agent_dir)
+
+    files = []
+    for run in runs:
+        metadata = {field: run[field] for field in manifest.RUN_FIELDS}
+        metadata["source"] = source
+        path = event_cache.cache_file(cache_dir, run["agent_dir"])
+        if path.exists():
+            files.append((metadata, path))
+    return files
+
+
+def dataset_files(dataset_dir):
+    """Return ``[(run metadata, Parquet file)]`` of a partitioned dataset."""
+    return [
+        (
+            json.loads(
+                event_cache.pq.read_schema(file).metadata[partitioned_dataset.RUN_KEY]
+            ),
+            file,
+        )
+        for _, file in partitioned_dataset.partition_files(dataset_dir)
+    ]
+
+
+def _sql_string(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def is_dataset(path):
+    return any(Path(path).glob("env_name=*"))
+
+
+def split_source(path):
+    """Return ``(source, path)`` of a ``<source>=<path>`` argument.
+
+    The source is None for paths without a label, e.g. datasets.
+    """
+    source, separator, labelled = str(path).partition("=")
+    if separator and not Path(path).exists() and "/" not in source:
+        return source, labelled
+    return None, path
+
+
+def connect(paths, workers=1, threads=None, memory_limit=None):
+    """Return a DuckDB connection with the ``results`` view over ``paths``.
+
+    Every path is either a results root as ``<source>=<root>`` or a
+    partitioned dataset written with ``tools.dataset``. ``threads`` and
+    ``memory_limit`` (e.g. ``"4GB"``) are passed on to DuckDB, which spills to
+    disk beyond the memory limit.
+    """
+    if not is_available():
+        raise ImportError("duckdb and pyarrow are required for SQL queries")
+
+    files = []
+    for path in paths:
+        source, path = split_source(path)
+        if is_dataset(path):
+            files.extend(dataset_files(path))
+        elif source is None:
+            raise ValueError(f"Results root without a source label: {path}")
+        else:
+            files.extend(root_files(path, source, workers))
+    if not files:
+        raise ValueError(f"No runs found in: {', '.join(map(str, paths))}")
+
+    runs = pd.DataFrame(
+        [{column: metadata[column] for column in RUN_COLUMNS} for metadata, _ in files]
+    )
+    # Missing metadata is stored as "None" in the run names, NULL in SQL
+    for column in INTEGER_COLUMNS:
+        runs[column] = pd.to_numeric(runs[column], errors="coerce").astype("Int64")
+    runs["file"] = [str(file) for _, file in files]
+
+    connection = duckdb.connect()
+    if threads is not None:
+        connection.execute(f"SET threads = {int(threads)}")
+    if memory_limit is not None:
+        connection.execute("SET memory_limit = ?", [memory_limit])
+    connection.register("runs_frame", runs)
+    connection.execute("CREATE TEMP TABLE runs AS SELECT * FROM runs_frame")
+    connection.unregister("runs_frame")
+    file_list = ", ".join(_sql_string(file) for file in runs["file"])
+    connection.execute(f"""
+        CREATE TEMP VIEW {VIEW_NAME} AS
+        SELECT {", ".join(f"runs.{column}" for column in RUN_COLUMNS)},
+            scalars.tag,
+            scalars.step,
+            CAST(scalars.value AS DOUBLE) AS value,
+            scalars.wall_time
+        FROM read_parquet([{file_list}], filename = true) AS scalars
+        JOIN runs ON scalars.filename = runs.file
+        """)
+    return connection
+
+
+def query(sql, paths, **kwargs):
+    """Run ``sql`` over the ``results`` view of ``paths`` and return a DataFrame."""
+    connection = connect(paths, **kwargs)
+    try:
+        return connection.execute(sql).df()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="results roots as <source>=<root>, e.g. "
+        "test=results/WindFarmControl/test, or partitioned datasets to query",
+    )
+    parser.add_argument(
+        "-e", "--execute", help="SQL to run, read from stdin if not given"
+    )
+    parser.add_argument("--csv", help="write the result to this CSV file")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--memory-limit")
+    args = parser.parse_args()
+
+    if not is_available():
+        sys.exit("duckdb and pyarrow are required for SQL queries")
+
+    result = query(
+        args.execute if args.execute is not None else sys.stdin.read(),
+        args.paths,
+        workers=args.workers,
+        threads=args.threads,
+        memory_limit=args.memory_limit,
+    )
+    if args.csv:
+        result.to_csv(args.csv, index=False)
+    else:
+        with pd.option_context("display.max_rows", None, "display.width", None):
+            print(result.to_string(index=False))
@@ -0,0 +1,159 @@
+"""Streaming mean and standard deviation of the scalars of a results tree.
+
+Instead of building the long-format DataFrame of every scalar, every event file
+is decoded in fixed-size chunks (``tools.tfevents.iter_scalar_chunks``) and the
+values of every chunk are folded into running accumulators, one per run and
+tag, holding the count, mean and sum of squared deviations (Welford). Chunks
+are combined with the pairwise update of Chan et al., so memory stays
+proportional to the number of groups and the chunk size, not to the number of
+scalars or the size of the event files. Summarize one or more results roots
+with::
+
+    python -m tools.running_stats results/WindFarmControl/test
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from tools import cache as event_cache
+from tools import manifest
+from tools.loader import READ_ERRORS, _sorted_categories
+from tools.tfevents import ScalarColumns, iter_scalar_chunks
+
+GROUP_KEYS = ["difficulty_or_pattern_value", "task", "id", "tag"]
+
+
+class RunningStats:
+    """Count, mean and sum of squared deviations (``m2``) per group key.
+
+    Groups are kept in order of first appearance. NaN values are skipped like
+    in pandas, a group without values has a NaN mean and std.
+    """
+
+    def __init__(self, key_names=GROUP_KEYS):
+        self.key_names = list(key_names)
+        self.groups = {}
+
+    def __len__(self):
+        return len(self.groups)
+
+    def _merge(self, key, count, mean, m2):
+        current = self.groups.get(key)
+        if current is None or current[0] == 0:
+            self.groups[key] = (count, mean, m2)
+        elif count:
+            total = current[0] + count
+            delta = mean - current[1]
+            self.groups[key] = (
+                total,
+                current[1] + delta * count / total,
+                current[2] + m2 + delta * delta * current[0] * count / total,
+            )
+
+    def add_columns(self, prefix, columns):
+        """Fold a ScalarColumns chunk into the groups ``(*prefix, tag)``."""
+        codes = np.frombuffer(columns.codes, dtype=np.int32)
+        values = np.frombuffer(columns.values, dtype=np.float32).astype(np.float64)
+        valid = ~np.isnan(values)
+        codes, values = codes[valid], values[valid]
+        tag_count = len(columns.tags)
+        counts = np.bincount(codes, minlength=tag_count)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = np.bincount(codes, weights=values, minlength=tag_count) / counts
+        deviations = values - means[codes]
+        m2s = np.bincount(codes, weights=deviations * deviations, minlength=tag_count)
+        for tag, count, mean, m2 in zip(columns.tags, counts, means, m2s):
+            self._merge((*prefix, tag), int(count), float(mean), float(m2))
+
+    def update(self, other):
+        """Merge the groups of another RunningStats, e.g. of a worker."""
+        for key, (count, mean, m2) in other.groups.items():
+            self._merge(key, count, mean, m2)
+
+    def frame(self):
+        """Return the key columns with ``count``, ``mean`` and ``std`` per group.
+
+        Key columns are categorical with sorted categories and the rows are
+        sorted by them, like a ``groupby`` of the loaded DataFrame.
+        """
+        keys = list(self.groups)
+        stats = np.array(list(self.groups.values()), dtype=np.float64).reshape(-1, 3)
+        count, mean, m2 = stats.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            std = np.sqrt(m2 / (count - 1))
+        mean[count == 0] = np.nan
+        std[count < 2] = np.nan
+        frame = {}
+        for position, name in enumerate(self.key_names):
+            values = [key[position] for key in keys]
+            frame[name] = pd.Categorical(values, categories=_sorted_categories(values))
+        frame = pd.DataFrame(frame).assign(
+            count=count.astype(np.int64), mean=mean, std=std
+        )
+        return frame.sort_values(self.key_names, kind="stable", ignore_index=True)
+
+
+def stream_agent_dir(path, prefix, tag_filter=None, key_names=GROUP_KEYS):
+    """Return the RunningStats of one ``Agent`` directory, one chunk at a time.
+
+    Every file is folded into its own RunningStats first, so unreadable or
+    corrupt files are skipped as a whole like in ``load_event_data``.
+    """
+    stats = RunningStats(key_names)
+    for file in event_cache.event_files(path):
+        file_stats = RunningStats(key_names)
+        try:
+            for columns in iter_scalar_chunks(file, ScalarColumns(tag_filter)):
+                file_stats.add_columns(prefix, columns)
+        except READ_ERRORS as error:
+            print(f"Skipping unreadable event file: {file} ({error})")
+            continue
+        stats.update(file_stats)
+    return stats
+
+
+def stream_event_statistics(
+    root_dir, run_filter=None, tag_filter=None, workers=1, key_names=GROUP_KEYS
+):
+    """Return the RunningStats of every scalar below ``root_dir``.
+
+    Groups are keyed by the run fields in ``key_names`` followed by the tag,
+    ``run_filter`` and ``tag_filter`` select runs and scalars like in
+    ``load_event_data``. With ``workers > 1`` runs are folded in a process pool
+    and only their accumulators are sent back.
+    """
+    paths = []
+    prefixes = []
+    for run in manifest.scan(root_dir):
+        if run_filter is not None and not run_filter(run["name"]):
+            continue
+        paths.append(run["agent_dir"])
+        prefixes.append(tuple(run[name] for name in key_names[:-1]))
+
+    stream = partial(stream_agent_dir, tag_filter=tag_filter, key_names=key_names)
+    stats = RunningStats(key_names)
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for run_stats in executor.map(stream, paths, prefixes):
+                stats.update(run_stats)
+    else:
+        for path, prefix in zip(paths, prefixes):
+            stats.update(stream(path, prefix))
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("root_dirs", nargs="+", help="results roots to summarize")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    for root_dir in args.root_dirs:
+        stats = stream_event_statistics(root_dir, workers=args.workers)
+        print(f"{root_dir}: {len(stats)} groups")
+        with pd.option_context("display.max_rows", None, "display.width", None):
+            print(stats.frame().to_string(index=False))
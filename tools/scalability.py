@@ -0,0 +1,72 @@
+"""Throughput and scaling efficiency from the wall time of the events.
+
+Every summary event carries the wall time it was written at, so the steps per
+second of a run follow from consecutive summary steps. ``run_throughput`` keeps
+them over time per run, ``scaling_efficiency`` compares the mean throughput of
+the runs of every agent count to the smallest agent count of the same
+environment:
+
+- speedup: throughput relative to the smallest agent count
+- efficiency: speedup divided by the relative agent count, 1 for perfect
+  scaling
+
+Load the runs with ``wall_time=True``. For the runs of the training roots this
+is how fast a run trained, for the runs of the test roots the inference
+throughput of the trained policies. Steps are summed over the agents of a
+behavior, so more agents per environment give more steps per second.
+"""
+
+COUNT_COLUMN = "agent_count"
+
+
+def run_throughput(data, run_keys):
+    """Return the steps per second over time of every run in ``data``.
+
+    ``data`` is a frame of ``load_event_data`` with ``wall_time``, every run is
+    identified by ``run_keys``. The result has one row per run and summary step
+    with its ``wall_time`` (the earliest of the scalars of the step),
+    ``elapsed`` seconds since the first summary of the run and
+    ``steps_per_second`` since the previous summary.
+    """
+    steps = (
+        data.groupby([*run_keys, "step"], observed=True)["wall_time"]
+        .min()
+        .reset_index()
+    )
+    grouped = steps.groupby(run_keys, observed=True, sort=False)
+    steps["elapsed"] = steps["wall_time"] - grouped["wall_time"].transform("min")
+    steps["steps_per_second"] = grouped["step"].diff() / grouped["wall_time"].diff()
+    return steps
+
+
+def run_summary(throughput, run_keys):
+    """Return the overall steps per second of every run, first to last summary."""
+    grouped = throughput.groupby(run_keys, observed=True)
+    first = grouped[["step", "wall_time"]].min()
+    last = grouped[["step", "wall_time"]].max()
+    summary = (last - first).rename(columns={"wall_time": "seconds"})
+    summary["steps_per_second"] = summary["step"] / summary["seconds"]
+    return summary.drop(columns="step").reset_index()
+
+
+def scaling_efficiency(throughput, run_keys, keys=("env_name",)):
+    """Return the speedup and parallel efficiency per ``keys`` and agent count.
+
+    The throughput of an agent count is the mean over its runs, the baseline of
+    every group of ``keys`` is its smallest agent count.
+    """
+    keys = list(keys)
+    runs = run_summary(throughput, run_keys)
+    runs[COUNT_COLUMN] = runs[COUNT_COLUMN].astype(int)
+    grouped = runs.groupby([*keys, COUNT_COLUMN], observed=True)["steps_per_second"]
+    table = grouped.agg(["size", "mean", "std"]).reset_index()
+    table.columns = [*keys, COUNT_COLUMN, "runs", "steps_per_second", "std"]
+    baseline = table.groupby(keys, observed=True)[COUNT_COLUMN].transform("idxmin")
+    table["speedup"] = (
+        table["steps_per_second"] / table.loc[baseline, "steps_per_second"].to_numpy()
+    )
+    table["ideal_speedup"] = (
+        table[COUNT_COLUMN] / table.loc[baseline, COUNT_COLUMN].to_numpy()
+    )
+    table["efficiency"] = table["speedup"] / table["ideal_speedup"]
+    return table
@@ -0,0 +1,438 @@
+"""Dependency-free reader for TensorBoard ``events.out.tfevents.*`` files.
+
+The event files written by ML-Agents are TFRecord streams of serialized
+``tensorflow.Event`` protos. Every record is framed as::
+
+    uint64 length | uint32 masked_crc32c(length) | data | uint32 masked_crc32c(data)
+
+Only the protobuf fields needed to recover scalar summaries are decoded, all
+other fields are skipped by wire type. This avoids importing TensorFlow just to
+iterate over ``tf.compat.v1.train.summary_iterator``.
+"""
+
+from array import array
+import re
+import struct
+
+try:
+    # Optional C implementation, only used when CRC checks are requested
+    from crc32c import crc32c as _crc32c
+except ImportError:
+    _crc32c = None
+
+
+_HEADER = struct.Struct("<QI")
+_FOOTER = struct.Struct("<I")
+_WALL_TIME = struct.Struct("<d")
+_HEADER_SIZE = _HEADER.size
+_FOOTER_SIZE = _FOOTER.size
+
+READ_CHUNK_SIZE = 2**20
+
+# Protobuf wire types
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+_FIXED32 = 5
+
+# tensorflow.DataType -> struct format of a single element in tensor_content
+_DTYPE_FORMATS = {
+    1: "<f",  # DT_FLOAT
+    2: "<d",  # DT_DOUBLE
+    3: "<i",  # DT_INT32
+    4: "<B",  # DT_UINT8
+    5: "<h",  # DT_INT16
+    6: "<b",  # DT_INT8
+    9: "<q",  # DT_INT64
+    10: "<?",  # DT_BOOL
+    17: "<H",  # DT_UINT16
+    19: "<e",  # DT_HALF
+    22: "<I",  # DT_UINT32
+    23: "<Q",  # DT_UINT64
+}
+
+
+def _make_crc32c_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE = _make_crc32c_table()
+
+
+def crc32c(data):
+    if _crc32c is not None:
+        return _crc32c(data)
+    crc = 0xFFFFFFFF
+    table = _CRC32C_TABLE
+    for b in data:
+        crc = table[(crc ^ b) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def masked_crc32c(data):
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + 0xA282EAD8) & 0xFFFFFFFF
+
+
+def _read_varint(buf, pos):
+    b = buf[pos]
+    if b < 0x80:
+        return b, pos + 1
+    result = b & 0x7F
+    shift = 7
+    pos += 1
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _to_signed64(value):
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _skip_field(buf, pos, wire_type):
+    if wire_type == _VARINT:
+        return _read_varint(buf, pos)[1]
+    if wire_type == _FIXED64:
+        return pos + 8
+    if wire_type == _LENGTH_DELIMITED:
+        length, pos = _read_varint(buf, pos)
+        return pos + length
+    if wire_type == _FIXED32:
+        return pos + 4
+    raise ValueError(f"Unsupported protobuf wire type: {wire_type}")
+
+
+def _decode_packed(buf, pos, end, wire_type, fmt, out):
+    # Repeated numeric fields can be written packed (length delimited) or one
+    # element per key, both encodings have to be accepted.
+    if wire_type == _LENGTH_DELIMITED:
+        length, pos = _read_varint(buf, pos)
+        stop = pos + length
+        if fmt is None:
+            while pos < stop:
+                value, pos = _read_varint(buf, pos)
+                out.append(value)
+        else:
+            out.extend(v[0] for v in struct.iter_unpack(fmt, buf[pos:stop]))
+        return stop
+    if fmt is None:
+        value, pos = _read_varint(buf, pos)
+        out.append(value)
+        return pos
+    out.append(struct.unpack_from(fmt, buf, pos)[0])
+    return pos + struct.calcsize(fmt)
+
+
+def _decode_tensor_scalar(buf, pos, end):
+    """Return the value of a single element numeric ``TensorProto`` or None."""
+    dtype = 0
+    content = None
+    values = []
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field, wire_type = key >> 3, key & 7
+        if field == 1 and wire_type == _VARINT:
+            dtype, pos = _read_varint(buf, pos)
+        elif field == 4 and wire_type == _LENGTH_DELIMITED:
+            length, pos = _read_varint(buf, pos)
+            content = (pos, pos + length)
+            pos += length
+        elif field == 5:
+            pos = _decode_packed(buf, pos, end, wire_type, "<f", values)
+        elif field == 6:
+            pos = _decode_packed(buf, pos, end, wire_type, "<d", values)
+        elif field in (7, 10):
+            ints = []
+            pos = _decode_packed(buf, pos, end, wire_type, None, ints)
+            values.extend(_to_signed64(v) for v in ints)
+        elif field == 11:
+            bools = []
+            pos = _decode_packed(buf, pos, end, wire_type, None, bools)
+            values.extend(bool(v) for v in bools)
+        elif field == 13:
+            halves = []
+            pos = _decode_packed(buf, pos, end, wire_type, None, halves)
+            values.extend(
+                struct.unpack("<e", struct.pack("<H", v & 0xFFFF))[0] for v in halves
+            )
+        else:
+            pos = _skip_field(buf, pos, wire_type)
+
+    if content is not None:
+        fmt = _DTYPE_FORMATS.get(dtype)
+        if fmt is None or content[1] - content[0] != struct.calcsize(fmt):
+            return None
+        return float(struct.unpack_from(fmt, buf, content[0])[0])
+    if len(values) == 1 and dtype in _DTYPE_FORMATS:
+        return float(values[0])
+    return None
+
+
+def _decode_summary_value(buf, pos, end, columns):
+    """Decode one ``Summary.Value`` into ``(tag_code, value)`` or None if not a scalar."""
+    tag = None
+    value = None
+    tensor = None
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field, wire_type = key >> 3, key & 7
+        if field == 1 and wire_type == _LENGTH_DELIMITED:
+            length, pos = _read_varint(buf, pos)
+            tag = buf[pos : pos + length]
+            # The tag is serialized first, so values of unwanted tags are
+            # skipped without being decoded
+            if not columns.wants(tag):
+                return None
+            pos += length
+        elif field == 2 and wire_type == _FIXED32:
+            # Legacy ``simple_value`` scalar
+            value = struct.unpack_from("<f", buf, pos)[0]
+            pos += 4
+        elif field == 8 and wire_type == _LENGTH_DELIMITED:
+            # TF2 style scalar stored as a tensor
+            length, pos = _read_varint(buf, pos)
+            tensor = (pos, pos + length)
+            pos += length
+        else:
+            pos = _skip_field(buf, pos, wire_type)
+
+    if value is None and tensor is not None:
+        value = _decode_tensor_scalar(buf, tensor[0], tensor[1])
+    if tag is None or value is None:
+        return None
+    return columns.tag_code(tag), value
+
+
+def _decode_event(buf, pos, end, columns):
+    """Append every scalar of the event at buf[pos:end] to ``columns``."""
+    wall_time = 0.0
+    step = 0
+    summary = None
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field, wire_type = key >> 3, key & 7
+        if field == 1 and wire_type == _FIXED64:
+            wall_time = _WALL_TIME.unpack_from(buf, pos)[0]
+            pos += 8
+        elif field == 2 and wire_type == _VARINT:
+            step, pos = _read_varint(buf, pos)
+            step = _to_signed64(step)
+        elif field == 5 and wire_type == _LENGTH_DELIMITED:
+            length, pos = _read_varint(buf, pos)
+            summary = (pos, pos + length)
+            pos += length
+        else:
+            pos = _skip_field(buf, pos, wire_type)
+
+    if summary is None:
+        return
+    pos, end = summary
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        if key == (1 << 3 | _LENGTH_DELIMITED):
+            length, pos = _read_varint(buf, pos)
+            scalar = _decode_summary_value(buf, pos, pos + length, columns)
+            if scalar is not None:
+                columns.steps.append(step)
+                columns.codes.append(scalar[0])
+                columns.values.append(scalar[1])
+                columns.wall_times.append(wall_time)
+            pos += length
+        else:
+            pos = _skip_field(buf, pos, key & 7)
+
+
+def _iter_record_spans(buf, check_crc=False, file_offset=0):
+    """Yield ``(start, end)`` of each complete record payload in ``buf``.
+
+    A truncated trailing record, as found in files that are still being
+    written, ends the iteration silently. ``file_offset`` is the position of
+    ``buf`` in the file and only used in error messages.
+    """
+    pos = 0
+    size = len(buf)
+    while pos + _HEADER_SIZE <= size:
+        length, length_crc = _HEADER.unpack_from(buf, pos)
+        start = pos + _HEADER_SIZE
+        end = start + length
+        if end + _FOOTER_SIZE > size:
+            return
+        if check_crc:
+            if masked_crc32c(buf[pos : pos + 8]) != length_crc:
+                raise ValueError(
+                    f"Corrupt record length at byte offset {file_offset + pos}"
+                )
+            if masked_crc32c(buf[start:end]) != _FOOTER.unpack_from(buf, end)[0]:
+                raise ValueError(
+                    f"Corrupt record data at byte offset {file_offset + pos}"
+                )
+        yield start, end
+        pos = end + _FOOTER_SIZE
+
+
+def iter_records(file_path, check_crc=False):
+    """Yield the raw serialized ``Event`` payload of every record in the file."""
+    with open(file_path, "rb") as f:
+        buf = f.read()
+    for start, end in _iter_record_spans(buf, check_crc):
+        yield buf[start:end]
+
+
+class TagFilter:
+    """Include/exclude predicate on summary tags.
+
+    Every pattern is either an exact tag, a prefix ending in ``/`` such as
+    ``"Policy/"``, or a compiled regular expression that is searched in the
+    tag. A tag is kept if it matches any ``include`` pattern (or ``include``
+    is None) and no ``exclude`` pattern.
+    """
+
+    def __init__(self, include=None, exclude=None):
+        self.include = None if include is None else list(include)
+        self.exclude = list(exclude or [])
+
+    @staticmethod
+    def _matches(tag, patterns):
+        for pattern in patterns:
+            if isinstance(pattern, re.Pattern):
+                if pattern.search(tag):
+                    return True
+            elif pattern.endswith("/"):
+                if tag.startswith(pattern):
+                    return True
+            elif tag == pattern:
+                return True
+        return False
+
+    def __call__(self, tag):
+        if self.include is not None and not self._matches(tag, self.include):
+            return False
+        return not self._matches(tag, self.exclude)
+
+
+class ScalarColumns:
+    """Typed column buffers filled by the reader.
+
+    Steps are stored as int64, values as float32, the wall time of their event
+    in seconds since the epoch as float64 and tags as int32 codes into
+    ``tags``, so a parsed file never materializes one Python object per scalar.
+    The same instance can be passed to several ``read_scalars_into`` calls to
+    share one tag dictionary across files.
+
+    With a ``tag_filter`` only scalars whose tag passes it are decoded, the
+    decision is made once per distinct tag.
+    """
+
+    def __init__(self, tag_filter=None):
+        self.steps = array("q")
+        self.codes = array("i")
+        self.values = array("f")
+        self.wall_times = array("d")
+        self.tags = []
+        self.tag_filter = tag_filter
+        self._tag_codes = {}
+        self._wanted = {}
+
+    def __len__(self):
+        return len(self.steps)
+
+    def wants(self, raw_tag):
+        if self.tag_filter is None:
+            return True
+        wanted = self._wanted.get(raw_tag)
+        if wanted is None:
+            wanted = self._wanted[raw_tag] = self.tag_filter(raw_tag.decode("utf-8"))
+        return wanted
+
+    def tag_code(self, raw_tag):
+        code = self._tag_codes.get(raw_tag)
+        if code is None:
+            code = self._tag_codes[raw_tag] = len(self.tags)
+            self.tags.append(raw_tag.decode("utf-8"))
+        return code
+
+    def truncate(self, size):
+        del self.steps[size:]
+        del self.codes[size:]
+        del self.values[size:]
+        del self.wall_times[size:]
+
+    def rows(self):
+        tags = self.tags
+        return [
+            (step, tags[code], value, wall_time)
+            for step, code, value, wall_time in zip(
+                self.steps, self.codes, self.values, self.wall_times
+            )
+        ]
+
+
+def read_scalars_into(file_path, columns, check_crc=False, offset=0):
+    """Append all scalar summaries of the file to ``columns``.
+
+    Both legacy ``simple_value`` summaries and TF2 single element tensor
+    summaries are decoded; images, histograms and text summaries are skipped.
+
+    Reading starts at byte ``offset``, which must be a record boundary. The
+    returned offset points just past the last complete record, so a file that
+    is still being written can be read again from there once it has grown.
+    """
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        buf = f.read()
+    end_offset = 0
+    for start, end in _iter_record_spans(buf, check_crc, offset):
+        _decode_event(buf, start, end, columns)
+        end_offset = end + _FOOTER_SIZE
+    return offset + end_offset
+
+
+def iter_scalar_chunks(file_path, columns, check_crc=False, chunk_size=READ_CHUNK_SIZE):
+    """Decode the scalar summaries of the file ``chunk_size`` bytes at a time.
+
+    For every chunk ``columns`` is emptied, filled with the scalars of the
+    records completed by the chunk and yielded. Its tag dictionary is kept, so
+    tag codes stay valid across chunks. Memory is bounded by the chunk size (or
+    the largest record) instead of the file size. A truncated trailing record
+    is ignored like in ``read_scalars_into``.
+    """
+    with open(file_path, "rb") as f:
+        pending = b""
+        offset = 0
+        while chunk := f.read(chunk_size):
+            buf = pending + chunk
+            columns.truncate(0)
+            end_offset = 0
+            for start, end in _iter_record_spans(buf, check_crc, offset):
+                _decode_event(buf, start, end, columns)
+                end_offset = end + _FOOTER_SIZE
+            pending = buf[end_offset:]
+            offset += end_offset
+            yield columns
+
+
+def read_scalars(file_path, check_crc=False, tag_filter=None):
+    """Return ``(step, tag, value, wall_time)`` tuples for all scalar summaries."""
+    columns = ScalarColumns(tag_filter)
+    read_scalars_into(file_path, columns, check_crc)
+    return columns.rows()
+
+
+def extract_data_from_event_file(file_path, check_crc=False, tag_filter=None):
+    return [
+        {"step": step, "tag": tag, "value": value, "wall_time": wall_time}
+        for step, tag, value, wall_time in read_scalars(
+            file_path, check_crc, tag_filter
+        )
+    ]
@@ -0,0 +1,232 @@
+"""Profiling report of the ML-Agents timers of the runs below results roots.
+
+Every run writes ``run_logs/timers.json`` with the hierarchical timer blocks of
+the trainer, e.g. ``TrainerController.advance`` > ``env_step`` >
+``TorchPolicy.evaluate``, and gauges such as ``Agent.Step.mean``. The blocks of
+all runs are parsed into one table with a row per run and block. The time spent
+in a block itself (``exclusive``, for main thread blocks their total minus the
+totals of their main thread children) is attributed to the phase of the
+nearest enclosing block in ``PHASES``: setup, environment step, policy
+inference, trajectory processing, policy update or checkpointing. Blocks marked
+as parallel ran in the trainer threads or the environment workers next to the
+main thread, so only the main thread phases add up to the wall time of a run.
+
+Report where the time goes per environment, task and agent count, and the
+slowest runs and blocks, with::
+
+    python -m tools.timers results/WindFarmControl/train results/WindFarmControl/test
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import json
+
+import pandas as pd
+
+from tools import manifest
+
+TIMERS_PATH = Path("run_logs") / "timers.json"
+
+PHASES = {
+    "run_training.setup": "setup",
+    "TrainerController._reset_env": "setup",
+    "env_step": "env_step",
+    "TorchPolicy.evaluate": "inference",
+    "process_trajectory": "trajectory",
+    "_update_policy": "update",
+    "RLTrainer._checkpoint": "checkpoint",
+    "TrainerController._save_models": "checkpoint",
+}
+OTHER_PHASE = "other"
+PHASE_ORDER = [*dict.fromkeys(PHASES.values()), OTHER_PHASE]
+
+REPORT_KEYS = ["env_name", "task", "agent_count"]
+STEP_GAUGE_SUFFIX = ".Step.mean"
+
+
+def timers_file(agent_dir):
+    return Path(agent_dir).parent / TIMERS_PATH
+
+
+def parse_timers(path):
+    """Return ``(run, blocks)`` of one ``timers.json``.
+
+    ``run`` holds the wall time, start and end time, the last step of the
+    furthest behavior and the ML-Agents version, ``blocks`` one dict per timer
+    block with its ``/`` separated path below the root.
+    """
+    with open(path) as file:
+        timers = json.load(file)
+    metadata = timers.get("metadata", {})
+    steps = [
+        gauge["value"]
+        for name, gauge in timers.get("gauges", {}).items()
+        if name.endswith(STEP_GAUGE_SUFFIX)
+    ]
+    run = {
+        "wall_time": timers.get("total", float("nan")),
+        "start_time": float(metadata.get("start_time_seconds", "nan")),
+        "end_time": float(metadata.get("end_time_seconds", "nan")),
+        "steps": max(steps) if steps else float("nan"),
+        "mlagents_version": metadata.get("mlagents_version"),
+    }
+
+    blocks = []
+    pending = [("root", timers, 0, None, False)]
+    while pending:
+        block_path, block, depth, phase, parallel = pending.pop()
+        name = block_path.rsplit("/", 1)[-1]
+        phase = PHASES.get(name, phase)
+        parallel = parallel or block.get("is_parallel", False)
+        children = block.get("children", {})
+        if parallel:
+            exclusive = block.get("self", 0.0)
+        else:
+            # Parallel children are timed on their own and are not part of the
+            # self time of a main thread block, e.g. the environment workers
+            exclusive = block.get("total", 0.0) - sum(
+                child.get("total", 0.0)
+                for child in children.values()
+                if not child.get("is_parallel", False)
+            )
+        blocks.append(
+            {
+                "block": block_path,
+                "timer": name,
+                "depth": depth,
+                "phase": phase or OTHER_PHASE,
+                "parallel": parallel,
+                "count": block.get("count", 0),
+                "total": block.get("total", 0.0),
+                "self": block.get("self", 0.0),
+                "exclusive": exclusive,
+            }
+        )
+        prefix = "" if depth == 0 else f"{block_path}/"
+        pending.extend(
+            (f"{prefix}{child_name}", child, depth + 1, phase, parallel)
+            for child_name, child in reversed(children.items())
+        )
+    return run, blocks
+
+
+def load_run(run):
+    """Return ``(run row, block rows)`` of a manifest run, or None without timers."""
+    path = timers_file(run["agent_dir"])
+    if not path.exists():
+        return None
+    row, blocks = parse_timers(path)
+    metadata = {field: run[field] for field in manifest.RUN_FIELDS}
+    metadata["name"] = run["name"]
+    row = {**metadata, **row}
+    row["steps_per_second"] = row["steps"] / row["wall_time"]
+    return row, [{**metadata, **block} for block in blocks]
+
+
+def load_timers(root_dirs, workers=1):
+    """Return ``(runs, blocks)`` DataFrames of the timers of every run.
+
+    ``runs`` has one row per run with its metadata, wall time and throughput,
+    ``blocks`` one row per run and timer block.
+    """
+    runs = [run for root_dir in root_dirs for run in manifest.scan(root_dir)]
+    if workers > 1 and len(runs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            loaded = list(executor.map(load_run, runs))
+    else:
+        loaded = [load_run(run) for run in runs]
+    loaded = [item for item in loaded if item is not None]
+    return (
+        pd.DataFrame([row for row, _ in loaded]),
+        pd.DataFrame([block for _, blocks in loaded for block in blocks]),
+    )
+
+
+def phase_times(blocks):
+    """Return the seconds per run (rows) and phase (columns).
+
+    Phases of parallel blocks get a `` (parallel)`` suffix, the main thread
+    phases of a run add up to its wall time.
+    """
+    blocks = blocks.assign(
+        phase=blocks["phase"].where(
+            ~blocks["parallel"], blocks["phase"] + " (parallel)"
+        )
+    )
+    times = blocks.pivot_table(
+        index="name", columns="phase", values="exclusive", aggfunc="sum", fill_value=0.0
+    )
+    order = PHASE_ORDER + [f"{phase} (parallel)" for phase in PHASE_ORDER]
+    return times[[phase for phase in order if phase in times.columns]]
+
+
+def phase_report(runs, blocks, by=REPORT_KEYS):
+    """Return the mean wall time, throughput and seconds per phase of every group.
+
+    Groups keep the order of their first run.
+    """
+    times = phase_times(blocks)
+    table = runs.set_index("name")[[*by, "wall_time", "steps_per_second"]].join(times)
+    grouped = table.groupby(by, sort=False)
+    return grouped.size().rename("runs").to_frame().join(grouped.mean())
+
+
+def slowest_runs(runs, top=10):
+    """Return the ``top`` runs with the lowest throughput."""
+    columns = ["name", *manifest.RUN_FIELDS, "wall_time", "steps", "steps_per_second"]
+    return runs.sort_values("steps_per_second", na_position="last", kind="stable")[
+        columns
+    ].head(top)
+
+
+def slowest_blocks(blocks, top=10):
+    """Return the ``top`` timer blocks with the highest mean time of their own.
+
+    Every block has the number of runs it appears in, the mean and max of its
+    own time and the run of the max.
+    """
+    blocks = blocks[blocks["block"] != "root"]
+    grouped = blocks.groupby(["block", "phase", "parallel"], sort=False)
+    table = grouped["exclusive"].agg(["size", "mean", "max"])
+    table.columns = ["runs", "mean_exclusive", "max_exclusive"]
+    table["mean_total"] = grouped["total"].mean()
+    table["slowest_run"] = blocks.loc[grouped["exclusive"].idxmax(), "name"].to_numpy()
+    return table.sort_values("mean_exclusive", ascending=False, kind="stable").head(top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("root_dirs", nargs="+", help="results roots to profile")
+    parser.add_argument(
+        "--by", nargs="+", default=REPORT_KEYS, help="run fields to group by"
+    )
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--csv", help="write the table of all timer blocks to this file"
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    runs, blocks = load_timers(args.root_dirs, args.workers)
+    if runs.empty:
+        raise SystemExit("No timers.json found")
+    if args.csv:
+        blocks.to_csv(args.csv, index=False)
+
+    with pd.option_context(
+        "display.max_rows",
+        None,
+        "display.max_columns",
+        None,
+        "display.width",
+        None,
+        "display.float_format",
+        "{:.1f}".format,
+    ):
+        print(f"Seconds per phase, mean of {len(runs)} runs:")
+        print(phase_report(runs, blocks, args.by).to_string())
+        print("\nSlowest runs by steps per second:")
+        print(slowest_runs(runs, args.top).to_string(index=False))
+        print("\nSlowest blocks by mean time of their own:")
+        print(slowest_blocks(blocks, args.top).to_string())
@@ -1,97 +1,398 @@
-import tensorflow as tf
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import seaborn as sns
+import matplotlib
 import matplotlib.pyplot as plt
-from pathlib import Path
+from matplotlib.backends.backend_pdf import PdfPages
+import argparse
 import math
+from pathlib import Path
+import os
+import numpy as np
 import pandas as pd
 import matplotlib.colors as mcolors
-import re
 
+from tools.aggregate import CI_METHODS, split_lines, step_bands
+from tools.dataset import iter_partitions, run_index
+from tools.loader import RUN_COLUMNS, load_event_data
+from tools.plot_cache import PlotCache, fingerprint, source_digest
+from tools.tfevents import TagFilter
+
+# Figures are rebuilt when the plotting code changes
+PLOT_SOURCE_DIGEST = source_digest(
+    __file__, Path(__file__).parent / "tools" / "aggregate.py"
+)
+
+
+def list_directories(root_dir, label, workers=1, tag_filter=None):
+    return load_event_data(root_dir, label, workers=workers, tag_filter=tag_filter)
+
+
+def decimate(values, max_points=2000, codes=None):
+    """Return the sorted positions of ``values`` to keep for about ``max_points``.
+
+    ``values`` is one array or a 2D array with a column per series drawn from
+    the same rows, e.g. a line and its band. Rows are grouped into series by
+    ``codes`` (one series if None). Each series longer than ``max_points`` is
+    split into equal-count buckets of consecutive rows, and the first, last,
+    and for every column the minimum and maximum row of every bucket are kept,
+    so spikes survive in all columns.
+    """
+    values = np.asarray(values)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    if codes is None:
+        codes = np.zeros(len(values), dtype=np.int64)
+    sizes = np.bincount(codes)
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    position = np.arange(len(order)) - starts[sorted_codes]
+
+    # Every bucket keeps up to 2 + 2 * columns rows, short series keep every
+    # row, one bucket per row
+    buckets = max(1, max_points // (2 + 2 * values.shape[1]))
+    bucket_count = np.where(sizes > max_points, buckets, sizes)
+    bucket = position * bucket_count[sorted_codes] // sizes[sorted_codes]
+    bucket += np.concatenate(([0], np.cumsum(bucket_count)[:-1]))[sorted_codes]
+
+    bucket_starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    bucket_ends = np.append(bucket_starts[1:], len(bucket)) - 1
+    kept = [bucket_starts, bucket_ends]
+    for column in values[order].T:
+        # NaNs sort last for the minimum and first for the maximum, so they are
+        # only picked for buckets without any value
+        by_min = np.lexsort((np.where(np.isnan(column), np.inf, column), bucket))
+        by_max = np.lexsort((np.where(np.isnan(column), -np.inf, column), bucket))
+        kept.extend((by_min[bucket_starts], by_max[bucket_ends]))
+    return np.unique(order[np.concatenate(kept)])
+
+
+# Groups of one environment rendered by a worker task with the same figure
+GROUPS_PER_TASK = 4
+
+# Line vertices closer than half a pixel to the simplified path are dropped
+# when saving (default 1/9), 12% smaller decimated PDFs in
+# tools/benchmarks/bench_plot_output.py
+SAVE_RC_PARAMS = {"path.simplify_threshold": 0.5}
+
+
+def group_output_file(output_path, key):
+    difficulty_or_pattern_key, difficulty_or_pattern_value, task, env_name = key
+    return f"{output_path}/{env_name}_results_{difficulty_or_pattern_key}_{difficulty_or_pattern_value}_task_{task}.pdf"
+
+
+class GroupFigure:
+    """Axes grid of the group plots of one environment, reused across groups.
+
+    Creating the subplots, legends, labels and layout dominates the cost of a
+    figure, and it is the same for every group of an environment with the
+    same tags. A GroupFigure builds it once. ``draw`` then only swaps the line
+    and band data, the titles and the axis limits, and lays the figure out
+    again when its tick labels changed.
+    """
+
+    # Define custom colors for training and testing
+    palette = {"training": "#FF1D25", "test": "#14DFB4"}
+
+    def __init__(self, tags, rasterized=False):
+        self.tags = tags
+        self.layout_labels = None
 
-def get_difficulty_or_pattern(name):
-    match = re.search(r"(pattern|difficulty)_(\d+)", name)
-    if match:
-        return match.group(0), int(
-            match.group(2)
-        )  # Change group(1) to group(2) for the integer
-    else:
-        return ("None", "None")
+        # Determine the number of rows and columns for the grid
+        num_tags = len(tags)
+        num_cols = 6  # Number of columns for A4 ratio
+        num_rows = math.ceil(num_tags / num_cols)
 
+        # Set up the figure with an A4 ratio (1.414 height/width)
+        self.fig, axes = plt.subplots(
+            num_rows, num_cols, figsize=(11.69 * 2, 11.69 * 0.17 * num_rows)
+        )  #  * 1.414))
+        self.title = self.fig.suptitle("", fontsize=16)
 
-def get_task(name) -> int:
-    match = re.search(r"task_(\d+)", name)
-    if match:
-        return match.group(0), int(match.group(1))
-    else:
-        return ("None", "None")
+        # Flatten the axes array for easy iteration
+        axes = axes.flatten()
+        self.axes = axes[:num_tags]
+
+        self.lines = {}
+        self.bands = {}
+        for ax, tag in zip(self.axes, tags):
+            for source, color in self.palette.items():
+                (self.lines[tag, source],) = ax.plot(
+                    [], [], color=color, label=source, rasterized=rasterized
+                )
+                self.bands[tag, source] = ax.fill_between(
+                    [],
+                    [],
+                    [],
+                    color=color,
+                    alpha=0.2,
+                    linewidth=0,
+                    rasterized=rasterized,
+                )
+            ax.set_title(tag.split("/")[1])
+            ax.set_xlabel("Step")
+            ax.set_ylabel("Value")
 
+        # Hide any unused subplots
+        for ax in axes[num_tags:]:
+            self.fig.delaxes(ax)
 
-def get_id(name) -> int:
-    match = re.search(r"id_(\d+)", name)
-    if match:
-        return match.group(0), int(match.group(1))
-    else:
-        return ("None", "None")
-
-
-def extract_data_from_event_file(file_path):
-    data = []
-    for summary in tf.compat.v1.train.summary_iterator(str(file_path)):
-        for value in summary.summary.value:
-            if value.HasField("simple_value"):
-                data.append(
-                    {
-                        "step": summary.step,
-                        "tag": value.tag,
-                        "value": value.simple_value,
-                    }
-                )
-    return data
-
-
-def list_directories(root_dir, label):
-    all_data = []
-    root_path = Path(root_dir)
-    for path in root_path.rglob("*"):
-        if path.is_dir() and str(path).endswith("Agent"):
-            name = path.parent.name
-            env_name = name.split("_")[0]
-            difficulty_or_pattern = get_difficulty_or_pattern(name)
-            difficulty_or_pattern_key = difficulty_or_pattern[0].split("_")[0]
-            difficulty_or_pattern_value = difficulty_or_pattern[1]
-            task = get_task(name)[1]
-            id = get_id(name)[1]
-            print(f"Processing: {name}")
-            print(
-                f"{difficulty_or_pattern_key}: {difficulty_or_pattern_value}, Task: {task}, ID: {id}"
-            )
+    def draw(self, key, lines, max_points=2000):
+        """Show the ``split_lines`` of one group, decimated to ``max_points``."""
+        difficulty_or_pattern_key, difficulty_or_pattern_value, task, env_name = key
+        difficulty_or_pattern_label = (
+            f"{difficulty_or_pattern_key.capitalize()}: {difficulty_or_pattern_value}, "
+            if difficulty_or_pattern_key != "None"
+            else ""
+        )
+        self.title.set_text(
+            f"{env_name} Train & Test Metrics: {difficulty_or_pattern_label}Task: {task}"
+        )
 
-            # Search for the specific file inside the "Agent" directory
-            for file in path.iterdir():
-                if file.name.startswith("events.out.tfevents"):
-                    # Extract data from the event file
-                    data = extract_data_from_event_file(file)
-                    # Append additional context data
-                    for entry in data:
-                        entry["difficulty_or_pattern_key"] = difficulty_or_pattern_key
-                        entry["difficulty_or_pattern_value"] = (
-                            difficulty_or_pattern_value
-                        )
-                        entry["task"] = task
-                        entry["id"] = id
-                        entry["env_name"] = env_name
-                        entry["source"] = label
-                    all_data.extend(data)
+        for ax, tag in zip(self.axes, self.tags):
+            ax.ignore_existing_data_limits = True
+            shown = []
+            for source in self.palette:
+                line = lines.get((tag, source))
+                artist = self.lines[tag, source]
+                band = self.bands[tag, source]
+                artist.set_visible(line is not None)
+                band.set_visible(line is not None)
+                if line is None:
+                    continue
+                if max_points and len(line["step"]) > max_points:
+                    kept = decimate(
+                        np.column_stack((line["value"], line["lower"], line["upper"])),
+                        max_points,
+                    )
+                    line = {column: array[kept] for column, array in line.items()}
+                artist.set_data(line["step"], line["value"])
+                if hasattr(band, "set_data"):
+                    band.set_data(line["step"], line["lower"], line["upper"])
+                else:
+                    # matplotlib < 3.10 cannot update a fill_between in place
+                    band.remove()
+                    band = self.bands[tag, source] = ax.fill_between(
+                        line["step"],
+                        line["lower"],
+                        line["upper"],
+                        color=artist.get_color(),
+                        alpha=0.2,
+                        linewidth=0,
+                        rasterized=artist.get_rasterized(),
+                    )
+                points = np.concatenate(
+                    [
+                        np.column_stack((line["step"], line[column]))
+                        for column in ("value", "lower", "upper")
+                    ]
+                )
+                ax.update_datalim(points[np.isfinite(points).all(axis=1)])
+                shown.append(artist)
+            ax.legend(handles=shown, title="source")
+            ax.autoscale_view()
+
+        labels = self.tick_labels()
+        if labels != self.layout_labels:
+            self.fig.tight_layout()
+            self.layout_labels = labels
+        return self.fig
+
+    def tick_labels(self):
+        """Return the tick labels and offsets of every panel for the current limits.
+
+        Panel titles are fixed by the tags and the height of the suptitle does
+        not depend on its text, so only these can change the layout.
+        """
+        labels = []
+        for ax in self.axes:
+            for axis in (ax.xaxis, ax.yaxis):
+                formatter = axis.get_major_formatter()
+                labels.extend(formatter.format_ticks(axis.get_majorticklocs()))
+                labels.append(formatter.get_offset())
+        return labels
+
+
+class GroupFigures:
+    """The GroupFigure of the last environment and tags, closed on ``close``.
+
+    Consecutive groups with the same environment and tags share one figure, a
+    new layout closes the previous figure.
+    """
+
+    def __init__(self):
+        self.layout = None
+        self.figure = None
+
+    def get(self, layout, tags, rasterized):
+        if self.layout != layout:
+            self.close()
+            self.layout = layout
+            self.figure = GroupFigure(tags, rasterized)
+        return self.figure
+
+    def close(self):
+        if self.figure is not None:
+            plt.close(self.figure.fig)
+        self.layout = None
+        self.figure = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def group_figure(
+    key,
+    group,
+    figures,
+    max_points=2000,
+    ci="bootstrap",
+    level=0.95,
+    n_boot=1000,
+    rasterized=False,
+):
+    """Plot the mean and error band per step of one group, one panel per tag.
+
+    The returned figure belongs to ``figures`` (a GroupFigures) and is reused
+    by the next call for the same environment and tags, so it must not be
+    closed by the caller. With ``rasterized`` the lines and bands are
+    rasterized when saved, while text and axes stay vector graphics.
+    """
+    # Get unique tags
+    unique_tags = group["tag"].unique()
 
-    return pd.DataFrame(all_data)
+    excluded_tags = [
+        "Environment/Lesson Number/pattern",
+        "Environment/Lesson Number/difficulty",
+        "Environment/Lesson Number/task",
+    ]
 
+    # Remove excluded tags from unique tags
+    filtered_tags = [tag for tag in unique_tags if tag not in excluded_tags]
 
-# Function to downsample data
-def downsample(df, factor=4):
-    return df.iloc[::factor, :]
+    layout = (key[3], tuple(filtered_tags), rasterized)
+    figure = figures.get(layout, filtered_tags, rasterized)
+
+    # Partition once, so every subplot gets array slices instead of masking
+    # the whole group
+    bands = step_bands(group, ["tag", "source"], ci=ci, level=level, n_boot=n_boot)
+    lines = split_lines(bands, ["tag", "source"], ["step", "value", "lower", "upper"])
+    return figure.draw(key, lines, max_points)
+
+
+def plot_group(
+    key,
+    group,
+    output_path,
+    figures,
+    max_points=2000,
+    ci="bootstrap",
+    level=0.95,
+    n_boot=1000,
+    raster_dpi=None,
+):
+    """Write the ``group_figure`` of one group, rasterized at ``raster_dpi`` if set."""
+    fig = group_figure(
+        key,
+        group,
+        figures,
+        max_points,
+        ci,
+        level,
+        n_boot,
+        rasterized=raster_dpi is not None,
+    )
+    # Save the figure as an SVG file with a more specific name
+    output_file = group_output_file(output_path, key)
+    with plt.rc_context(SAVE_RC_PARAMS):
+        fig.savefig(output_file, format="pdf", dpi=raster_dpi or "figure")
+    return output_file
+
+
+def plot_group_batch(groups, output_path, *args):
+    """Write the ``plot_group`` of every ``(key, group)`` with one GroupFigures."""
+    with GroupFigures() as figures:
+        return [
+            plot_group(key, group, output_path, figures, *args) for key, group in groups
+        ]
 
 
-def plot_data_for_groups(combined_data_frame, output_path, down_sample_factor=4):
+def plot_groups_to_pages(groups, page_file, raster_dpi=None, **kwargs):
+    """Write the ``group_figure`` of every ``(key, group)`` as a page of a PDF.
+
+    ``page_file(key)`` returns the PDF of the page of a group. Pages are written
+    as ``groups`` yields them, so only the group being drawn is held in memory.
+    Returns the written files.
+    """
+    documents = {}
+    with plt.rc_context(SAVE_RC_PARAMS), GroupFigures() as figures:
+        try:
+            for key, group in groups:
+                output_file = page_file(key)
+                if output_file not in documents:
+                    documents[output_file] = PdfPages(output_file)
+                fig = group_figure(
+                    key, group, figures, rasterized=raster_dpi is not None, **kwargs
+                )
+                documents[output_file].savefig(fig, dpi=raster_dpi or "figure")
+        finally:
+            for pdf in documents.values():
+                pdf.close()
+    return list(documents)
+
+
+def _init_render_worker():
+    # Workers only write files, never open a window
+    matplotlib.use("Agg")
+
+
+def plot_data_for_groups(
+    combined_data_frame,
+    output_path,
+    max_points=2000,
+    workers=1,
+    ci="bootstrap",
+    level=0.95,
+    n_boot=1000,
+    cache=True,
+    raster_dpi=None,
+    multipage=False,
+):
+    """Write one PDF per (pattern/difficulty, task, environment) group.
+
+    ``combined_data_frame`` is either the DataFrame of all runs or an iterator
+    of ``(key, DataFrame)`` partitions from ``tools.dataset.iter_partitions``,
+    read one at a time. Each group must then lie in a single partition, e.g.
+    with ``by=["env_name", "task", "difficulty_or_pattern_value"]``.
+
+    Every panel shows the mean over runs per step and source with an error band
+    from ``step_bands``. ``ci``, ``level`` and ``n_boot`` select the band
+    method, confidence level and number of bootstrap resamples. Each line is
+    decimated with ``decimate`` to at most ``max_points`` points,
+    ``max_points=None`` plots every step.
+
+    With ``raster_dpi`` set the lines and bands are rasterized at that DPI,
+    text and axes stay vector graphics. With ``multipage`` the groups of each
+    environment are written as the pages of one ``<env>_results.pdf``
+    instead, rendered in this process in the order of the groups. Pages are
+    written as the partitions are read, so the pages of an environment are
+    not held in memory.
+
+    With ``cache`` enabled only groups whose rows or plot parameters changed
+    since the last call are rendered, see ``tools.plot_cache``. Multi-page
+    files of partitions are rendered while their pages are fingerprinted and
+    only replaced if one of them changed.
+
+    With ``workers > 1`` the figures are rendered in a process pool. Each task
+    receives only the rows and columns of up to ``GROUPS_PER_TASK`` groups of
+    one environment, which share one figure, and at most two tasks per worker
+    are in flight so the pending slices stay bounded.
+
+    Reused figures are closed when the groups of a call or task are done.
+    """
     # Check if the required columns exist
     required_columns = {
         "step",
@@ -103,96 +404,237 @@ def plot_data_for_groups(combined_data_frame, output_path, down_sample_factor=4)
         "env_name",
         "source",
     }
-    if not required_columns.issubset(combined_data_frame.columns):
-        print(
-            f"DataFrame is missing required columns. Found columns: {combined_data_frame.columns}"
-        )
-        return
+    if isinstance(combined_data_frame, pd.DataFrame):
+        if not required_columns.issubset(combined_data_frame.columns):
+            print(
+                f"DataFrame is missing required columns. Found columns: {combined_data_frame.columns}"
+            )
+            return
+        partitions = [(None, combined_data_frame)]
+    else:
+        partitions = combined_data_frame
+
+    def grouped():
+        # Group by pattern, task, and environment name
+        for _, frame in partitions:
+            yield from frame.groupby(
+                [
+                    "difficulty_or_pattern_key",
+                    "difficulty_or_pattern_value",
+                    "task",
+                    "env_name",
+                ],
+                observed=True,
+            )
 
-    # Group by pattern, task, and environment name
-    grouped = combined_data_frame.groupby(
-        ["difficulty_or_pattern_key", "difficulty_or_pattern_value", "task", "env_name"]
-    )
+    plot_cache = PlotCache(output_path) if cache else None
+    columns = ["step", "tag", "value", "source"]
+    parameters = {
+        "max_points": max_points,
+        "ci": ci,
+        "level": level,
+        "n_boot": n_boot,
+        "raster_dpi": raster_dpi,
+    }
 
-    for (
-        difficulty_or_pattern_key,
-        difficulty_or_pattern_value,
-        task,
-        env_name,
-    ), group in grouped:
+    def stale_groups():
+        for key, group in grouped():
+            group = group[columns]
+            output_file = group_output_file(output_path, key)
+            digest = fingerprint(PLOT_SOURCE_DIGEST, key, parameters, group)
+            if plot_cache is None or plot_cache.check(output_file, digest):
+                inputs = {"group": [str(k) for k in key], "rows": len(group)}
+                yield key, group, output_file, digest, {**inputs, **parameters}
 
-        # Get unique tags
-        unique_tags = group["tag"].unique()
+    def rendered(output_file, digest, inputs):
+        if plot_cache is not None:
+            plot_cache.record(output_file, digest, inputs)
 
-        excluded_tags = [
-            "Environment/Lesson Number/pattern",
-            "Environment/Lesson Number/difficulty",
-            "Environment/Lesson Number/task",
-        ]
+    if multipage:
 
-        # Remove excluded tags from unique tags
-        filtered_tags = [tag for tag in unique_tags if tag not in excluded_tags]
+        def document_file(key):
+            return f"{output_path}/{key[3]}_results.pdf"
 
-        # Determine the number of rows and columns for the grid
-        num_tags = len(filtered_tags)
-        num_cols = 6  # Number of columns for A4 ratio
-        num_rows = math.ceil(num_tags / num_cols)
+        def page_file(key):
+            # Pages go to a temporary file that replaces the document if it changed
+            return f"{document_file(key)}.{os.getpid()}.tmp"
 
-        # Set up the figure with an A4 ratio (1.414 height/width)
-        fig, axes = plt.subplots(
-            num_rows, num_cols, figsize=(11.69 * 2, 11.69 * 0.17 * num_rows)
-        )  #  * 1.414))
+        def document_digest(digests):
+            return fingerprint(
+                PLOT_SOURCE_DIGEST, parameters, [digest for _, digest in digests]
+            )
 
-        difficulty_or_pattern_label = (
-            f"{difficulty_or_pattern_key.capitalize()}: {difficulty_or_pattern_value}, "
-            if difficulty_or_pattern_key != "None"
-            else ""
-        )
+        documents = {}
+        unchanged = set()
+        if plot_cache is not None and isinstance(partitions, list):
+            # The rows are in memory already, a first pass finds the documents
+            # that do not have to be rendered
+            for key, group in grouped():
+                documents.setdefault(document_file(key), []).append(
+                    (key, fingerprint(key, group[columns]))
+                )
+            unchanged = {
+                output_file
+                for output_file, digests in documents.items()
+                if plot_cache.is_fresh(output_file, document_digest(digests))
+            }
+            documents.clear()
+
+        def pages():
+            for key, group in grouped():
+                group = group[columns]
+                output_file = document_file(key)
+                documents.setdefault(output_file, []).append(
+                    (key, fingerprint(key, group))
+                )
+                if output_file not in unchanged:
+                    yield key, group
+
+        try:
+            plot_groups_to_pages(
+                pages(),
+                page_file,
+                raster_dpi,
+                max_points=max_points,
+                ci=ci,
+                level=level,
+                n_boot=n_boot,
+            )
+            for output_file, digests in documents.items():
+                digest = document_digest(digests)
+                if plot_cache is None or plot_cache.check(output_file, digest):
+                    os.replace(page_file(digests[0][0]), output_file)
+                    page_keys = [[str(k) for k in key] for key, _ in digests]
+                    rendered(output_file, digest, {"pages": page_keys, **parameters})
+        finally:
+            for output_file, digests in documents.items():
+                Path(page_file(digests[0][0])).unlink(missing_ok=True)
+    elif workers <= 1:
+        with GroupFigures() as figures:
+            for key, group, *result in stale_groups():
+                plot_group(
+                    key,
+                    group,
+                    output_path,
+                    figures,
+                    max_points,
+                    ci,
+                    level,
+                    n_boot,
+                    raster_dpi,
+                )
+                rendered(*result)
+    else:
 
-        fig.suptitle(
-            f"{env_name} Train & Test Metrics: {difficulty_or_pattern_label}Task: {task}",
-            fontsize=16,
+        def batches():
+            batch = []
+            for key, group, *result in stale_groups():
+                if batch and (
+                    len(batch) == GROUPS_PER_TASK or batch[-1][0][3] != key[3]
+                ):
+                    yield batch
+                    batch = []
+                batch.append((key, group, result))
+            if batch:
+                yield batch
+
+        def finish(future, results):
+            future.result()
+            for result in results:
+                rendered(*result)
+
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_render_worker
+        ) as executor:
+            pending = {}
+            for batch in batches():
+                if len(pending) >= 2 * workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finish(future, pending.pop(future))
+                future = executor.submit(
+                    plot_group_batch,
+                    [(key, group) for key, group, _ in batch],
+                    output_path,
+                    max_points,
+                    ci,
+                    level,
+                    n_boot,
+                    raster_dpi,
+                )
+                pending[future] = [result for *_, result in batch]
+            for future, results in pending.items():
+                finish(future, results)
+
+    if plot_cache is not None:
+        plot_cache.save()
+        print(plot_cache)
+
+
+def average_matrices(data):
+    """Return ``{tag: matrix}`` of the mean value per task and pattern/difficulty.
+
+    All matrices come from a single groupby over (tag, task, pattern/difficulty)
+    instead of masking the whole frame once per matrix cell. Rows and columns
+    are the tasks and patterns/difficulties in order of appearance, cells
+    without data are NaN and means are rounded to 3 decimals.
+
+    ``data`` is either a DataFrame or an iterator of ``(key, DataFrame)``
+    partitions from ``tools.dataset.iter_partitions`` that each hold whole
+    (task, pattern/difficulty) cells, like the partitions of one split.
+    """
+    partitions = [(None, data)] if isinstance(data, pd.DataFrame) else data
+    tasks = {}
+    patterns = {}
+    means = []
+    for _, frame in partitions:
+        tasks.update(dict.fromkeys(frame["task"].unique()))
+        patterns.update(dict.fromkeys(frame["difficulty_or_pattern_value"].unique()))
+        # Series.mean per group sums exactly like the per-cell masks did, the
+        # cython groupby mean does not, which could flip a rounded digit
+        means.append(
+            frame.groupby(
+                ["tag", "task", "difficulty_or_pattern_value"], observed=True
+            )["value"]
+            .agg(lambda values: values.mean())
+            .round(3)
         )
+    task_index = pd.Index(list(tasks))
+    pattern_index = pd.Index(list(patterns))
 
-        # Flatten the axes array for easy iteration
-        axes = axes.flatten()
+    matrices = {}
+    for (tag, task, pattern), value in (
+        item for partition_means in means for item in partition_means.items()
+    ):
+        if tag not in matrices:
+            matrices[tag] = np.full((len(tasks), len(patterns)), np.nan)
+        matrices[tag][task_index.get_loc(task), pattern_index.get_loc(pattern)] = value
+    return {
+        tag: pd.DataFrame(matrix, index=task_index, columns=pattern_index)
+        for tag, matrix in matrices.items()
+    }
 
-        # Define custom colors for training and testing
-        palette = {"training": "#FF1D25", "test": "#14DFB4"}
-
-        # Plot each tag in its own subplot
-        for i, tag in enumerate(filtered_tags):
-            ax = axes[i]
-            data = group[group["tag"] == tag]
-            if down_sample_factor > 1:
-                data = downsample(data, down_sample_factor)
-            sns.lineplot(
-                data=data,
-                x="step",
-                y="value",
-                hue="source",
-                palette=palette,
-                ax=ax,
-            )
-            ax.set_title(tag.split("/")[1])
-            ax.set_xlabel("Step")
-            ax.set_ylabel("Value")
 
-        # Hide any unused subplots
-        for j in range(i + 1, len(axes)):
-            fig.delaxes(axes[j])
+def frame_run_index(data):
+    """Return ``(runs, tags)`` of a loaded DataFrame, like ``run_index``."""
+    runs = data.drop_duplicates(RUN_COLUMNS)[RUN_COLUMNS].reset_index(drop=True)
+    return runs, list(data["tag"].unique())
+
 
-        plt.tight_layout()
+def _matrix_inputs(matrix):
+    # Matrices are hashed with their labels, the task and pattern values
+    return (
+        None if matrix is None else [list(matrix.index), list(matrix.columns), matrix]
+    )
 
-        # Save the figure as an SVG file with a more specific name
-        output_file = f"{output_path}/{env_name}_results_{difficulty_or_pattern_key}_{difficulty_or_pattern_value}_task_{task}.pdf"
-        plt.savefig(output_file, format="pdf")
-        plt.close()
 
+def plot_aggregated_matrices_on_one_sheet(
+    runs, unique_tags, output_path, avg_matrices, cache=True
+):
+    """Plot the ``average_matrices`` of one environment, one heatmap per tag.
 
-def plot_aggregated_matrices_on_one_sheet(data, output_path):
-    # Get unique tags, tasks, and patterns/difficulties
-    unique_tags = data["tag"].unique()
+    ``runs`` and ``unique_tags`` are the ``run_index`` of the data.
+    """
 
     excluded_tags = [
         "Environment/Lesson Number/pattern",
@@ -207,8 +649,15 @@ def plot_aggregated_matrices_on_one_sheet(data, output_path):
     # Remove excluded tags from unique tags
     filtered_tags = [tag for tag in unique_tags if tag not in excluded_tags]
 
-    tasks = data["task"].unique()
-    patterns = data["difficulty_or_pattern_value"].unique()
+    env_name = runs["env_name"].iloc[0]
+    output_file = f"{output_path}/{env_name}_average_sheet.pdf"
+    if cache:
+        plot_cache = PlotCache(output_path)
+        matrices = {tag: _matrix_inputs(avg_matrices[tag]) for tag in filtered_tags}
+        digest = fingerprint(PLOT_SOURCE_DIGEST, env_name, matrices)
+        if not plot_cache.check(output_file, digest):
+            print(plot_cache)
+            return
 
     # Calculate the number of subplots needed
     num_tags = len(filtered_tags)
@@ -221,7 +670,7 @@ def plot_aggregated_matrices_on_one_sheet(data, output_path):
     fig_width = cell_width * ncols
     fig_height = cell_height * nrows
     fig, axes = plt.subplots(nrows=nrows, ncols=ncols, figsize=(fig_width, fig_height))
-    fig.suptitle(f"Average Values for All Tags: {data['env_name'][0]}", fontsize=16)
+    fig.suptitle(f"Average Values for All Tags: {env_name}", fontsize=16)
 
     # Flatten the axes array for easy iteration
     axes = axes.flatten()
@@ -232,22 +681,7 @@ def plot_aggregated_matrices_on_one_sheet(data, output_path):
     )
 
     for i, tag in enumerate(filtered_tags):
-        # Initialize a matrix to store the average values with NaNs
-        avg_matrix = pd.DataFrame(index=tasks, columns=patterns, dtype=float)
-
-        for task in tasks:
-            for pattern in patterns:
-                # Filter data for the current task, pattern/difficulty, and tag
-                task_pattern_data = data[
-                    (data["task"] == task)
-                    & (data["difficulty_or_pattern_value"] == pattern)
-                    & (data["tag"] == tag)
-                ]
-
-                # Calculate the average value and fill the matrix
-                if not task_pattern_data.empty:
-                    avg_value = task_pattern_data["value"].mean()
-                    avg_matrix.loc[task, pattern] = round(avg_value, 3)
+        avg_matrix = avg_matrices[tag]
 
         # Format the matrix to show 0.0 for 0.000 values
         avg_matrix = avg_matrix.map(lambda x: 0.0 if x == 0 else x)
@@ -265,9 +699,7 @@ def plot_aggregated_matrices_on_one_sheet(data, output_path):
             ax=axes[i],
             fmt="",
         )
-        sub_title = (
-            tag if tag.split("/")[0] not in data["env_name"][0] else tag.split("/")[1]
-        )
+        sub_title = tag if tag.split("/")[0] not in env_name else tag.split("/")[1]
         axes[i].set_title(f"Average Values for Tag: {sub_title}")
         axes[i].set_xlabel("Pattern/Difficulty")
         axes[i].set_ylabel("Task")
@@ -278,13 +710,22 @@ def plot_aggregated_matrices_on_one_sheet(data, output_path):
 
     plt.tight_layout(rect=[0, 0, 1, 0.95])
     # Save as SVG
-    plt.savefig(
-        f"{output_path}/{data['env_name'].iloc[0]}_average_sheet.pdf", format="pdf"
-    )
+    plt.savefig(output_file, format="pdf")
     plt.close()
 
+    if cache:
+        plot_cache.record(output_file, digest, {"tags": filtered_tags})
+        plot_cache.save()
+        print(plot_cache)
+
 
-def plot_cumulative_reward_multiple(data_list, output_path):
+def plot_cumulative_reward_multiple(
+    runs_list, output_path, avg_matrices_list, cache=True
+):
+    """Plot the cumulative reward and one other tag per environment.
+
+    ``runs_list`` holds the runs of the ``run_index`` of every environment.
+    """
     tag_list = [
         ["Environment/Cumulative Reward", "Losses/Policy Loss"],
         [
@@ -302,8 +743,24 @@ def plot_cumulative_reward_multiple(data_list, output_path):
         ],
     ]
 
+    output_file = f"{output_path}/cumulative_reward_multiple.pdf"
+    if cache:
+        plot_cache = PlotCache(output_path)
+        inputs = [
+            [
+                runs["env_name"].iloc[0],
+                runs["difficulty_or_pattern_key"].iloc[0],
+                {tag: _matrix_inputs(avg_matrices.get(tag)) for tag in tags},
+            ]
+            for runs, avg_matrices, tags in zip(runs_list, avg_matrices_list, tag_list)
+        ]
+        digest = fingerprint(PLOT_SOURCE_DIGEST, inputs)
+        if not plot_cache.check(output_file, digest):
+            print(plot_cache)
+            return
+
     # Determine the grid size for subplots
-    num_datasets = len(data_list)
+    num_datasets = len(runs_list)
     grid_cols = 2
     grid_rows = num_datasets
 
@@ -320,24 +777,16 @@ def plot_cumulative_reward_multiple(data_list, output_path):
         "custom_gradient", ["#14DFB4", "#FF931E", "#FF1D25"]
     )
 
-    for idx, data in enumerate(data_list):
+    for idx, (runs, avg_matrices) in enumerate(zip(runs_list, avg_matrices_list)):
         for jdx, tag in enumerate(tag_list[idx]):
-            tasks = data["task"].unique()
-            patterns = data["difficulty_or_pattern_value"].unique()
-
-            avg_matrix = pd.DataFrame(index=tasks, columns=patterns, dtype=float)
-
-            for task in tasks:
-                for pattern in patterns:
-                    task_pattern_data = data[
-                        (data["task"] == task)
-                        & (data["difficulty_or_pattern_value"] == pattern)
-                        & (data["tag"] == tag)
-                    ]
-
-                    if not task_pattern_data.empty:
-                        avg_value = task_pattern_data["value"].mean()
-                        avg_matrix.loc[task, pattern] = round(avg_value, 3)
+            avg_matrix = avg_matrices.get(tag)
+            if avg_matrix is None:
+                # Tag not logged in this environment, plot an empty matrix
+                avg_matrix = pd.DataFrame(
+                    index=runs["task"].unique(),
+                    columns=runs["difficulty_or_pattern_value"].unique(),
+                    dtype=float,
+                )
 
             avg_matrix = avg_matrix.map(lambda x: 0.0 if x == 0 else x)
             formatted_annotations = avg_matrix.map(
@@ -356,22 +805,29 @@ def plot_cumulative_reward_multiple(data_list, output_path):
                 fmt="",
             )
 
-            if data["difficulty_or_pattern_key"][0] == "None":
+            difficulty_or_pattern_key = runs["difficulty_or_pattern_key"].iloc[0]
+            if difficulty_or_pattern_key == "None":
                 ax.set_xlabel("Difficulty")
             else:
-                ax.set_xlabel(f"{data['difficulty_or_pattern_key'][0].capitalize()}")
+                ax.set_xlabel(f"{difficulty_or_pattern_key.capitalize()}")
             ax.set_ylabel("Task")
-            ax.set_title(f"{data['env_name'].iloc[0]}: {tag.split('/')[1]}")
+            ax.set_title(f"{runs['env_name'].iloc[0]}: {tag.split('/')[1]}")
 
     # Remove any unused subplots
-    for idx in range(len(data_list) * len(tag_list), len(axes)):
+    for idx in range(len(runs_list) * len(tag_list), len(axes)):
         print(f"removing: {idx}")
         fig.delaxes(axes[idx])
 
     plt.tight_layout()
-    plt.savefig(f"{output_path}/cumulative_reward_multiple.pdf", format="pdf")
+    plt.savefig(output_file, format="pdf")
     plt.close()
 
+    if cache:
+        environments = [runs["env_name"].iloc[0] for runs in runs_list]
+        plot_cache.record(output_file, digest, {"environments": environments})
+        plot_cache.save()
+        print(plot_cache)
+
 
 path_prefix = "C:/Users/pdsie/Documents/hivex-results/results/"
 
@@ -398,30 +854,115 @@ output_paths = [
 ]
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot the baseline results")
+    parser.add_argument(
+        "--dataset",
+        help="partitioned dataset written with python -m tools.dataset, read one "
+        "partition at a time instead of loading whole results roots",
+    )
+    parser.add_argument(
+        "--ci",
+        choices=[str(method) for method in CI_METHODS],
+        default="bootstrap",
+        help="error band of the group plots, None for no band",
+    )
+    parser.add_argument(
+        "--ci-level",
+        type=float,
+        default=0.95,
+        help="confidence level of the error band",
+    )
+    parser.add_argument(
+        "--n-boot",
+        type=int,
+        default=1000,
+        help="bootstrap resamples of the bootstrap error band",
+    )
+    parser.add_argument(
+        "--raster-dpi",
+        type=int,
+        help="rasterize the lines and bands of the group plots at this DPI, "
+        "text and axes stay vector graphics",
+    )
+    parser.add_argument(
+        "--multipage",
+        action="store_true",
+        help="write the group plots of each environment as the pages of one "
+        "<env>_results.pdf",
+    )
+    args = parser.parse_args()
+    ci = None if args.ci == "None" else args.ci
 
-    datasets = []
+    runs_list = []
+    matrices = []
+
+    # Curriculum lesson numbers are not plotted anywhere
+    tag_filter = TagFilter(exclude=["Environment/Lesson Number/"])
 
     for train_root_dir, test_root_dir, output_path in zip(
         train_dirs, test_dirs, output_paths
     ):
-        training_data = list_directories(
-            train_root_dir,
-            "training",
-        )
-        test_data = list_directories(test_root_dir, "test")
+        if args.dataset:
+            env_name = Path(test_root_dir).parent.name
 
-        datasets.append(test_data)
+            # Only the tags, tasks and patterns of the test runs are needed
+            # besides the matrices, the scalars are read one partition at a time
+            test_runs, test_tags = run_index(
+                args.dataset, tag_filter=tag_filter, env_name=env_name, source="test"
+            )
+            test_matrices = average_matrices(
+                iter_partitions(
+                    args.dataset,
+                    tag_filter=tag_filter,
+                    env_name=env_name,
+                    source="test",
+                )
+            )
+            # Both sources of a task and pattern are plotted together
+            group_data = iter_partitions(
+                args.dataset,
+                by=["env_name", "task", "difficulty_or_pattern_value"],
+                tag_filter=tag_filter,
+                env_name=env_name,
+            )
+        else:
+            training_data = list_directories(
+                train_root_dir,
+                "training",
+                workers=os.cpu_count(),
+                tag_filter=tag_filter,
+            )
+            test_data = list_directories(
+                test_root_dir, "test", workers=os.cpu_count(), tag_filter=tag_filter
+            )
+            test_runs, test_tags = frame_run_index(test_data)
+            test_matrices = average_matrices(test_data)
+            group_data = pd.concat([training_data, test_data])
+
+        runs_list.append(test_runs)
+        matrices.append(test_matrices)
 
         #### 1
 
-        plot_data_for_groups(pd.concat([training_data, test_data]), output_path, 1)
+        plot_data_for_groups(
+            group_data,
+            output_path,
+            workers=os.cpu_count(),
+            ci=ci,
+            level=args.ci_level,
+            n_boot=args.n_boot,
+            raster_dpi=args.raster_dpi,
+            multipage=args.multipage,
+        )
 
         #### 2
 
-        plot_aggregated_matrices_on_one_sheet(test_data, output_path)
+        plot_aggregated_matrices_on_one_sheet(
+            test_runs, test_tags, output_path, test_matrices
+        )
 
     ### 3
 
     plot_cumulative_reward_multiple(
-        datasets, "C:/Users/pdsie/Documents/hivex-results/results"
+        runs_list, "C:/Users/pdsie/Documents/hivex-results/results", matrices
     )
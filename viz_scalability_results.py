@@ -1,112 +1,93 @@
-import tensorflow as tf
 import seaborn as sns
 import matplotlib.pyplot as plt
-from pathlib import Path
 import math
+import os
 import pandas as pd
 import matplotlib.colors as mcolors
-import re
-
-
-def get_difficulty_or_pattern(name):
-    match = re.search(r"(pattern|difficulty)_(\d+)", name)
-    if match:
-        return match.group(0), int(
-            match.group(2)
-        )  # Change group(1) to group(2) for the integer
-    else:
-        return ("None", "None")
-
-
-def get_agent_count(name):
-    match = re.search(r"(agent_count)_(\d+)", name)
-    if match:
-        return match.group(0), int(
-            match.group(2)
-        )  # Change group(1) to group(2) for the integer
-    else:
-        return ("None", "None")
-
-
-def get_task(name) -> int:
-    match = re.search(r"task_(\d+)", name)
-    if match:
-        return match.group(0), int(match.group(1))
-    else:
-        return ("None", "None")
-
-
-def get_id(name) -> int:
-    match = re.search(r"id_(\d+)", name)
-    if match:
-        return match.group(0), int(match.group(1))
-    else:
-        return ("None", "None")
-
-
-def extract_data_from_event_file(file_path):
-    data = []
-    for summary in tf.compat.v1.train.summary_iterator(str(file_path)):
-        for value in summary.summary.value:
-            if value.HasField("simple_value"):
-                data.append(
-                    {
-                        "step": summary.step,
-                        "tag": value.tag,
-                        "value": value.simple_value,
-                    }
-                )
-    return data
-
-
-def list_directories(root_dir, label):
-    all_data = []
-    root_path = Path(root_dir)
-    for path in root_path.rglob("*"):
-        if (
-            path.is_dir()
-            and str(path).endswith("Agent")
-            and "agent_count" in path.parent.name
-        ):
-            name = path.parent.name
-            env_name = name.split("_")[0]
-            difficulty_or_pattern = get_difficulty_or_pattern(name)
-            difficulty_or_pattern_key = difficulty_or_pattern[0].split("_")[0]
-            difficulty_or_pattern_value = difficulty_or_pattern[1]
-            agent_count = get_agent_count(name)[1]
-            task = get_task(name)[1]
-            id = get_id(name)[1]
-            print(f"Processing: {name}")
-            print(
-                f"{difficulty_or_pattern_key}: {difficulty_or_pattern_value}, Task: {task}, ID: {id}, Agent Count: {agent_count}"
-            )
 
-            # Search for the specific file inside the "Agent" directory
-            for file in path.iterdir():
-                if file.name.startswith("events.out.tfevents"):
-                    # Extract data from the event file
-                    data = extract_data_from_event_file(file)
-                    # Append additional context data
-                    for entry in data:
-                        entry["difficulty_or_pattern_key"] = difficulty_or_pattern_key
-                        entry["difficulty_or_pattern_value"] = (
-                            difficulty_or_pattern_value
-                        )
-                        entry["task"] = task
-                        entry["agent_count"] = agent_count
-                        entry["id"] = id
-                        entry["env_name"] = env_name
-                        entry["source"] = label
-                    all_data.extend(data)
-
-    return pd.DataFrame(all_data)
+from tools.loader import load_event_data
+from tools.scalability import run_throughput, scaling_efficiency
+from tools.tfevents import TagFilter
+
+RUN_COLUMNS = [
+    "difficulty_or_pattern_key",
+    "difficulty_or_pattern_value",
+    "task",
+    "agent_count",
+    "id",
+    "env_name",
+    "source",
+]
+
+
+def list_directories(root_dir, label, workers=1, tag_filter=None):
+    return load_event_data(
+        root_dir,
+        label,
+        run_filter=lambda name: "agent_count" in name,
+        run_columns=RUN_COLUMNS,
+        workers=workers,
+        tag_filter=tag_filter,
+        wall_time=True,
+    )
 
 
 import matplotlib.pyplot as plt
 import pandas as pd
 
 
-def plot_average_reward_for_each_agent_count(data_list, output_path):
+def plot_scaling(ax, efficiency, colors, label="Training"):
+    """Plot the speedup and parallel efficiency of one environment into ``ax``.
+
+    ``label`` names the runs the throughput was measured on.
+    """
+    ax.plot(
+        efficiency["agent_count"],
+        efficiency["speedup"],
+        marker="o",
+        label=f"{label} Speedup (steps/sec)",
+        color=colors[0],
+    )
+    ax.plot(
+        efficiency["agent_count"],
+        efficiency["ideal_speedup"],
+        linestyle="--",
+        label="Ideal Speedup",
+        color="gray",
+    )
+    efficiency_ax = ax.twinx()
+    efficiency_ax.plot(
+        efficiency["agent_count"],
+        efficiency["efficiency"],
+        marker="s",
+        label="Parallel Efficiency",
+        color=colors[1],
+    )
+    efficiency_ax.set_ylim(0, max(1.1, efficiency["efficiency"].max() * 1.1))
+    efficiency_ax.set_ylabel("Parallel Efficiency", fontsize=12)
+
+    ax.set_xlabel("Agent Count", fontsize=12)
+    ax.set_ylabel(f"{label} Speedup", fontsize=12)
+    ax.grid(True)
+    lines = ax.get_lines() + efficiency_ax.get_lines()
+    ax.legend(
+        lines,
+        [line.get_label() for line in lines],
+        loc="upper center",
+        bbox_to_anchor=(0.5, -0.3),
+        ncol=1,
+        fontsize=10,
+    )
+
+
+def plot_average_reward_for_each_agent_count(
+    data_list, output_path, efficiency_list=None, throughput_label="Training"
+):
+    """Plot the reward per agent count and the scaling of the throughput below.
+
+    Without ``efficiency_list`` the scaling is computed from the runs of
+    ``data_list``, ``throughput_label`` names the runs it was measured on.
+    """
     tag_list = [
         ["Environment/Cumulative Reward"],
         [
@@ -130,8 +111,9 @@ def plot_average_reward_for_each_agent_count(data_list, output_path):
         "Aerial Wildfire Suppression",
     ]
 
-    # Create subplots for each dataset in data_list with smaller scale
-    fig, axes = plt.subplots(1, 3, figsize=(15, 4))  # Adjusted figure size
+    # Reward per agent count on top, scaling of the training throughput below
+    fig, axes = plt.subplots(2, 3, figsize=(15, 9))  # Adjusted figure size
+    reward_axes, scaling_axes = axes
 
     # Loop through each dataset and corresponding tags_of_interest
     for i, (data, tags_of_interest) in enumerate(zip(data_list, tag_list)):
@@ -144,13 +126,13 @@ def plot_average_reward_for_each_agent_count(data_list, output_path):
 
         # Group by 'tag' and 'agent_count', then calculate the mean value
         df_grouped = df_filtered_extended.groupby(
-            ["tag", "agent_count"], as_index=False
+            ["tag", "agent_count"], as_index=False, observed=True
         )["value"].mean()
 
         # Plotting each tag's average value in the corresponding subplot
         for tag, color in zip(tags_of_interest, colors):
             df_tag_grouped = df_grouped[df_grouped["tag"] == tag]
-            axes[i].plot(
+            reward_axes[i].plot(
                 df_tag_grouped["agent_count"],
                 df_tag_grouped["value"],
                 marker="o",
@@ -159,19 +141,27 @@ def plot_average_reward_for_each_agent_count(data_list, output_path):
             )
 
         # Labeling for each subplot
-        axes[i].set_xlabel("Agent Count", fontsize=12)
-        axes[i].set_title(titles[i], fontsize=14)  # Set the custom title
+        reward_axes[i].set_xlabel("Agent Count", fontsize=12)
+        reward_axes[i].set_title(titles[i], fontsize=14)  # Set the custom title
 
         # Add grid to each subplot
-        axes[i].grid(True)
+        reward_axes[i].grid(True)
 
         # Add legend to each subplot
-        axes[i].legend(
+        reward_axes[i].legend(
             loc="upper center", bbox_to_anchor=(0.5, -0.3), ncol=1, fontsize=10
         )
 
+    if efficiency_list is None:
+        efficiency_list = [
+            scaling_efficiency(run_throughput(data, RUN_COLUMNS), RUN_COLUMNS)
+            for data in data_list
+        ]
+    for ax, efficiency in zip(scaling_axes, efficiency_list):
+        plot_scaling(ax, efficiency, colors, throughput_label)
+
     # Set the common y-axis label on the left side
-    fig.text(0.05, 0.67, "Average Value", va="center", rotation="vertical", fontsize=14)
+    fig.text(0.05, 0.75, "Average Value", va="center", rotation="vertical", fontsize=14)
 
     # Adjust layout to fit everything cleanly
     plt.tight_layout(
@@ -187,17 +177,69 @@ def plot_average_reward_for_each_agent_count(data_list, output_path):
 
 path_prefix = "C:/Users/pdsie/Documents/hivex-results/results/"
 
+train_dirs = [
+    f"{path_prefix}WindFarmControl/train",
+    f"{path_prefix}DroneBasedReforestation/train",
+    f"{path_prefix}AerialWildfireSuppression/train",
+]
 test_dirs = [
     f"{path_prefix}WindFarmControl/test",
     f"{path_prefix}DroneBasedReforestation/test",
     f"{path_prefix}AerialWildfireSuppression/test",
 ]
 output_path = f"{path_prefix}scalability_agent_count.pdf"
+throughput_path = f"{path_prefix}scalability_throughput.csv"
+efficiency_path = f"{path_prefix}scalability_efficiency.csv"
+test_throughput_path = f"{path_prefix}scalability_test_throughput.csv"
+test_efficiency_path = f"{path_prefix}scalability_test_efficiency.csv"
 
-datasets = []
 
-for test_root_dir in test_dirs:
-    test_data = list_directories(test_root_dir, "test")
-    datasets.append(test_data)
+def throughput_tables(data_list, throughput_path, efficiency_path, title):
+    """Write the throughput and scaling efficiency of every dataset to CSV."""
+    throughputs = [run_throughput(data, RUN_COLUMNS) for data in data_list]
+    efficiencies = [
+        scaling_efficiency(throughput, RUN_COLUMNS) for throughput in throughputs
+    ]
+    pd.concat(throughputs, ignore_index=True).to_csv(throughput_path, index=False)
+    efficiency = pd.concat(efficiencies, ignore_index=True)
+    efficiency.to_csv(efficiency_path, index=False)
+    print(title)
+    print(efficiency.to_string(index=False))
+    return efficiencies
 
-plot_average_reward_for_each_agent_count(datasets, output_path)
+
+if __name__ == "__main__":
+
+    datasets = []
+    training_datasets = []
+
+    for train_root_dir, test_root_dir in zip(train_dirs, test_dirs):
+        env_name = test_root_dir.split("/")[-2]
+        # Only the cumulative reward and the environment specific tags are plotted
+        tag_filter = TagFilter(
+            include=["Environment/Cumulative Reward", f"{env_name}/"]
+        )
+        test_data = list_directories(
+            test_root_dir, "test", workers=os.cpu_count(), tag_filter=tag_filter
+        )
+        datasets.append(test_data)
+
+        # The wall times of one tag are enough for the training throughput
+        training_data = list_directories(
+            train_root_dir,
+            "training",
+            workers=os.cpu_count(),
+            tag_filter=TagFilter(include=["Environment/Cumulative Reward"]),
+        )
+        training_datasets.append(training_data)
+
+    # Training steps per second over time per run and their scaling with agent
+    # count, the inference throughput of the test runs is reported separately
+    efficiencies = throughput_tables(
+        training_datasets, throughput_path, efficiency_path, "Training throughput"
+    )
+    throughput_tables(
+        datasets, test_throughput_path, test_efficiency_path, "Test throughput"
+    )
+
+    plot_average_reward_for_each_agent_count(datasets, output_path, efficiencies)